@@ -1,3 +1,8 @@
 from django.contrib import admin
+from .models import Repository, Branch, ReportJob, TrackedRepository
 
 # Register your models here.
+admin.site.register(Repository)
+admin.site.register(Branch)
+admin.site.register(ReportJob)
+admin.site.register(TrackedRepository)
@@ -0,0 +1,116 @@
+import time
+import contextvars
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from django.conf import settings
+from django.db import connections
+from .reports import iter_report_commits
+
+# Request fields applied to every repository of a batch unless the repository sets its own
+SHARED_FIELDS = ('branch', 'auth_token', 'auth_username')
+FILTER_FIELDS = ('username', 'email', 'start_date', 'end_date', 'all_branches', 'paths')
+
+
+def batch_report_params(data):
+    """
+    Build per-repository report parameters from a validated batch request
+
+    Args:
+        data: Validated data from BatchCommitRequestSerializer
+
+    Returns:
+        List of dicts in the shape of CommitRequestSerializer validated data
+    """
+    params = []
+    for repository in data['repositories']:
+        item = {field: data.get(field) for field in FILTER_FIELDS}
+        for field in SHARED_FIELDS:
+            item[field] = repository.get(field, data.get(field))
+        item['repo_path'] = repository['repo_path']
+        item['repo_type'] = repository['repo_type']
+        params.append(item)
+    return params
+
+
+def run_report(index, params):
+    """
+    Fetch the commits of one repository, catching its errors
+
+    Returns:
+        Dict with index, repo_path, repo_type, branch, status ('ok' or 'error'),
+        elapsed_ms and either commits or error
+    """
+    started = time.monotonic()
+    result = {
+        'index': index,
+        'repository': params['repo_path'],
+        'repo_type': params['repo_type'],
+        'branch': params.get('branch') or 'main',
+    }
+    try:
+        result['commits'] = list(iter_report_commits(params))
+        result['status'] = 'ok'
+    except ValueError as e:
+        result['status'] = 'error'
+        result['error'] = str(e)
+    except Exception as e:
+        result['status'] = 'error'
+        result['error'] = f"An unexpected error occurred: {str(e)}"
+    finally:
+        # Batch threads are discarded afterwards, so don't leave their database connections open
+        connections.close_all()
+    result['elapsed_ms'] = round((time.monotonic() - started) * 1000)
+    return result
+
+
+def iter_batch_results(params_list, provider_concurrency=None):
+    """
+    Run reports for several repositories in parallel
+
+    Repositories of each repo_type run at most provider_concurrency[repo_type]
+    at a time, so a batch does not exceed one provider's rate limits while the
+    others still make progress. A repository that fails yields an error result
+    and does not stop the others.
+
+    Args:
+        params_list: Per-repository parameters from batch_report_params
+        provider_concurrency: repo_type -> limit, defaults to settings.BATCH_PROVIDER_CONCURRENCY
+
+    Yields:
+        Result dicts from run_report, in order of completion
+    """
+    provider_concurrency = provider_concurrency or settings.BATCH_PROVIDER_CONCURRENCY
+
+    queues = {}
+    for index, params in enumerate(params_list):
+        queues.setdefault(params['repo_type'], deque()).append((index, params))
+    limits = {repo_type: max(1, provider_concurrency.get(repo_type, 1)) for repo_type in queues}
+    if not queues:
+        return
+
+    running = {}
+    with ThreadPoolExecutor(max_workers=sum(limits.values()), thread_name_prefix='batch') as executor:
+        def submit(repo_type):
+            # Start queued repositories of this type up to its limit
+            active = sum(1 for t in running.values() if t == repo_type)
+            queue = queues[repo_type]
+            while queue and active < limits[repo_type]:
+                # In the request's context, so its metrics include this repository's work
+                context = contextvars.copy_context()
+                running[executor.submit(context.run, run_report, *queue.popleft())] = repo_type
+                active += 1
+
+        try:
+            for repo_type in queues:
+                submit(repo_type)
+            while running:
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    repo_type = running.pop(future)
+                    submit(repo_type)
+                    yield future.result()
+        finally:
+            # The consumer stopped early: don't start the queued repositories
+            for future in running:
+                future.cancel()
+            queues.clear()
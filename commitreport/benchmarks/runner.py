@@ -0,0 +1,296 @@
+import os
+import json
+import time
+import resource
+import threading
+import multiprocessing
+from wsgiref.simple_server import make_server, WSGIRequestHandler
+import requests
+from django.test.utils import override_settings
+from .synthetic import RepositorySpec, generate_repository
+from .standins import ProviderStandIn
+
+# Repository sizes the suite knows, by name
+SIZES = {
+    '10k': 10_000,
+    '100k': 100_000,
+    '1m': 1_000_000,
+}
+
+CASES = ('git_service', 'github_service', 'bitbucket_service', 'serialize', 'api_commits')
+
+# The provider API cases read the newest API_COMMITS commits: every one of them
+# costs a request, so a full 1M commit history is out of reach
+API_COMMITS = 500
+
+# Repository names the stand-ins are asked for
+GITHUB_REPOSITORY = 'bench/repo'
+BITBUCKET_REPOSITORY = 'bench/repo'
+
+BASELINES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines.json')
+
+# Allowed growth over the baseline before a result counts as a regression
+DEFAULT_TOLERANCE = {
+    'wall_s': 0.5,
+    'peak_rss_mb': 0.25,
+}
+
+# Measured with provider responses uncached and without the commit index or
+# report cache, so every run does the full work
+BENCHMARK_SETTINGS = {
+    'HTTP_CACHE_ENABLED': False,
+    'COMMIT_INDEX_ENABLED': False,
+    'REPORT_CACHE_ENABLED': False,
+    'BITBUCKET_GIT_FIRST': False,
+    'ALLOWED_HOSTS': ['127.0.0.1'],
+}
+
+
+def run_benchmarks(sizes, cases=CASES, workdir=None, branches=8, files=2000, api_commits=API_COMMITS,
+                   isolate=True, report=print):
+    """
+    Generate the repositories and run the benchmark cases on them
+
+    Args:
+        sizes: Dict of size name -> number of commits
+        cases: Names of the cases to run
+        workdir: Directory the generated repositories are kept in, reused across runs
+        branches: Feature branches per repository
+        files: Distinct file paths per repository
+        api_commits: Commits read by the provider API cases
+        isolate: Run every case in a fresh process, so its peak RSS is its own
+        report: Function called with progress messages
+
+    Returns:
+        List of result dicts: size, case, commits, wall_s, peak_rss_mb, api_calls
+        and calls (API calls per endpoint)
+    """
+    results = []
+    for size, commits in sizes.items():
+        spec = RepositorySpec(commits, branches=branches, files=files)
+        repo_path = os.path.join(workdir, f"repo-{size}")
+        report(f"Preparing {size} repository ({commits} commits) in {repo_path}")
+        started = time.monotonic()
+        if generate_repository(repo_path, spec):
+            report(f"  generated in {time.monotonic() - started:.1f}s")
+
+        # Window of the newest commits for the provider API cases
+        start_date = spec.commit_date(max(commits - api_commits, 0))
+
+        with ProviderStandIn(repo_path) as standin:
+            for case in cases:
+                standin.reset_calls()
+                measured = measure_case(case, repo_path, standin.url, start_date, isolate)
+                result = dict(
+                    size=size,
+                    case=case,
+                    api_calls=sum(standin.calls.values()),
+                    calls=dict(sorted(standin.calls.items())),
+                    **measured
+                )
+                report(f"  {case}: {result['commits']} commits in {result['wall_s']}s, "
+                       f"peak RSS {result['peak_rss_mb']} MB, {result['api_calls']} API calls")
+                results.append(result)
+    return results
+
+
+def measure_case(case, repo_path, api_url, start_date, isolate=True):
+    """
+    Run one case and measure it
+
+    Returns:
+        Dict with commits, wall_s and peak_rss_mb
+    """
+    if not isolate:
+        return _measure(case, repo_path, api_url, start_date)
+
+    # A fresh interpreter, so peak RSS isn't inherited from earlier cases
+    context = multiprocessing.get_context('spawn')
+    receiver, sender = context.Pipe(duplex=False)
+    process = context.Process(target=_case_process, args=(sender, case, repo_path, api_url, start_date))
+    process.start()
+    sender.close()
+    try:
+        outcome = receiver.recv()
+    except EOFError:
+        outcome = {'error': f"benchmark process exited with code {process.exitcode}"}
+    process.join()
+    if 'error' in outcome:
+        raise RuntimeError(f"Benchmark case {case} failed: {outcome['error']}")
+    return outcome
+
+
+def _case_process(sender, case, repo_path, api_url, start_date):
+    try:
+        import django
+        django.setup()
+        sender.send(_measure(case, repo_path, api_url, start_date))
+    except Exception as e:
+        sender.send({'error': f"{type(e).__name__}: {e}"})
+    finally:
+        sender.close()
+
+
+def _measure(case, repo_path, api_url, start_date):
+    overrides = dict(BENCHMARK_SETTINGS, GITHUB_API_URL=api_url, BITBUCKET_API_URL=api_url)
+    with override_settings(**overrides):
+        runner = CASE_RUNNERS[case]
+        prepared = runner.prepare(repo_path, start_date)
+        started = time.perf_counter()
+        commits = runner.run(prepared)
+        wall = time.perf_counter() - started
+    # ru_maxrss is in kilobytes on Linux
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return {'commits': commits, 'wall_s': round(wall, 3), 'peak_rss_mb': round(peak_rss, 1)}
+
+
+class GitServiceCase:
+    """
+    Full history of main through GitService
+    """
+
+    def prepare(self, repo_path, start_date):
+        return repo_path
+
+    def run(self, repo_path):
+        from ..services.git_service import GitService
+        return _count(GitService().iter_commits(repo_path, branch='main'))
+
+
+class GitHubServiceCase:
+    """
+    Newest commits of main through GitHubService and the stand-in API
+    """
+
+    def prepare(self, repo_path, start_date):
+        return start_date
+
+    def run(self, start_date):
+        from ..services.github_service import GitHubService
+        return _count(GitHubService().iter_commits(GITHUB_REPOSITORY, branch='main', start_date=start_date))
+
+
+class BitbucketServiceCase:
+    """
+    Newest commits of main through BitbucketService's API path and the stand-in API
+    """
+
+    def prepare(self, repo_path, start_date):
+        return start_date
+
+    def run(self, start_date):
+        from ..services.bitbucket_service import BitbucketService
+        return _count(BitbucketService().iter_commits(BITBUCKET_REPOSITORY, branch='main', start_date=start_date))
+
+
+class SerializeCase:
+    """
+    Encoding the full history of main as response JSON; reading it isn't measured
+    """
+
+    def prepare(self, repo_path, start_date):
+        from ..services.git_service import GitService
+        return GitService().get_commits(repo_path, branch='main')
+
+    def run(self, commits):
+        from rest_framework.renderers import JSONRenderer
+        from ..encoders import CommitEncoder
+        JSONRenderer().render({'commits': CommitEncoder().data_list(commits)})
+        return len(commits)
+
+
+class ApiCommitsCase:
+    """
+    POST /api/commits/ for the full history of main, over HTTP to the WSGI application
+    """
+
+    def prepare(self, repo_path, start_date):
+        from django.core.wsgi import get_wsgi_application
+        server = make_server('127.0.0.1', 0, get_wsgi_application(), handler_class=QuietRequestHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server, repo_path
+
+    def run(self, prepared):
+        server, repo_path = prepared
+        try:
+            response = requests.post(
+                f"http://127.0.0.1:{server.server_port}/api/commits/",
+                json={'repo_path': repo_path, 'repo_type': 'local', 'branch': 'main'}
+            )
+            response.raise_for_status()
+            return response.content.count(b'"commit_hash":')
+        finally:
+            server.shutdown()
+            server.server_close()
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+CASE_RUNNERS = {
+    'git_service': GitServiceCase(),
+    'github_service': GitHubServiceCase(),
+    'bitbucket_service': BitbucketServiceCase(),
+    'serialize': SerializeCase(),
+    'api_commits': ApiCommitsCase(),
+}
+
+
+def _count(commits):
+    count = 0
+    for _ in commits:
+        count += 1
+    return count
+
+
+def load_baselines(path=BASELINES_PATH):
+    """
+    Get the stored baselines: size -> case -> measurements
+    """
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_baselines(results, path=BASELINES_PATH):
+    """
+    Store results as the new baselines, keeping those of sizes and cases not in results
+    """
+    baselines = load_baselines(path)
+    for result in results:
+        baselines.setdefault(result['size'], {})[result['case']] = {
+            key: result[key] for key in ('commits', 'wall_s', 'peak_rss_mb', 'api_calls')
+        }
+    with open(path, 'w') as f:
+        json.dump(baselines, f, indent=2, sort_keys=True)
+        f.write('\n')
+
+
+def compare(results, baselines, tolerance=None):
+    """
+    Compare results to baselines
+
+    Wall time and peak RSS may grow by their tolerance (a fraction of the
+    baseline). Commit and API call counts are deterministic and must match.
+
+    Returns:
+        List of regression descriptions, empty if there are none
+    """
+    tolerance = dict(DEFAULT_TOLERANCE, **(tolerance or {}))
+    regressions = []
+    for result in results:
+        baseline = baselines.get(result['size'], {}).get(result['case'])
+        if baseline is None:
+            continue
+        name = f"{result['size']} {result['case']}"
+        for key in ('commits', 'api_calls'):
+            if result[key] != baseline[key]:
+                regressions.append(f"{name}: {key} {result[key]} != baseline {baseline[key]}")
+        for key, allowed in tolerance.items():
+            limit = baseline[key] * (1 + allowed)
+            if result[key] > limit:
+                regressions.append(f"{name}: {key} {result[key]} > {limit:.3f} (baseline {baseline[key]})")
+    return regressions
@@ -0,0 +1,436 @@
+import re
+import json
+import threading
+from collections import Counter
+from datetime import datetime, timezone
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs, urlencode, unquote
+import git
+from ..services.git_log import iter_git_log
+
+# Page sizes the real APIs use when the client doesn't ask for one, and their maximums
+GITHUB_DEFAULT_PAGE_SIZE = 30
+GITHUB_MAX_PAGE_SIZE = 100
+BITBUCKET_DEFAULT_PAGE_SIZE = 30
+BITBUCKET_MAX_PAGE_SIZE = 100
+BITBUCKET_DIFFSTAT_PAGE_SIZE = 500
+
+# The atlassian client puts Bitbucket Cloud resources under /rest/api on hosts
+# other than api.bitbucket.org
+BITBUCKET_PREFIXES = ('/rest/api/2.0/', '/2.0/')
+
+GITHUB_ROUTES = [
+    ('github:repository', re.compile(r'/repos/(?P<owner>[^/]+)/(?P<repo>[^/]+)')),
+    ('github:branches', re.compile(r'/repos/[^/]+/[^/]+/branches')),
+    ('github:branch', re.compile(r'/repos/[^/]+/[^/]+/branches/(?P<branch>.+)')),
+    ('github:commits', re.compile(r'/repos/[^/]+/[^/]+/commits')),
+    ('github:commit', re.compile(r'/repos/[^/]+/[^/]+/commits/(?P<sha>[0-9a-f]{40})')),
+]
+BITBUCKET_ROUTES = [
+    ('bitbucket:repository', re.compile(r'repositories/(?P<workspace>[^/]+)/(?P<repo>[^/]+)')),
+    ('bitbucket:branches', re.compile(r'repositories/[^/]+/[^/]+/refs/branches')),
+    ('bitbucket:branch', re.compile(r'repositories/[^/]+/[^/]+/refs/branches/(?P<branch>.+)')),
+    ('bitbucket:commits', re.compile(r'repositories/[^/]+/[^/]+/commits(?:/(?P<revision>.+))?')),
+    ('bitbucket:diffstat', re.compile(r'repositories/[^/]+/[^/]+/diffstat/(?P<sha>[0-9a-f]{40})')),
+]
+
+
+class ProviderStandIn:
+    """
+    Local HTTP server answering the GitHub and Bitbucket Cloud API requests the services make
+
+    Every repository name is served from one local git repository: commit
+    listings with pagination, single commits with their files and stats,
+    diffstats, branches, and the rate-limit headers of both APIs. Requests are
+    counted per endpoint, so a benchmark can report how many API calls a
+    report took.
+
+    Usage:
+        with ProviderStandIn('/path/to/repo') as standin:
+            settings.GITHUB_API_URL = standin.url
+    """
+
+    def __init__(self, repo_path, rate_limit=5000):
+        """
+        Args:
+            repo_path: Local git repository to serve
+            rate_limit: Requests allowed per hour, reported in the rate-limit headers
+        """
+        self.git_dir = git.Repo(repo_path).git_dir
+        self.rate_limit = rate_limit
+        self.calls = Counter()
+        self._lock = threading.Lock()
+        self._listings = {}
+        self._commits = {}
+        self._server = None
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self._server.server_port}"
+
+    def start(self):
+        """
+        Start serving on a free local port, in a background thread
+        """
+        standin = self
+
+        class Handler(StandInRequestHandler):
+            pass
+        Handler.standin = standin
+
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def reset_calls(self):
+        with self._lock:
+            self.calls.clear()
+
+    def count_call(self, endpoint):
+        """
+        Count a request and get the total so far, for the rate-limit headers
+        """
+        with self._lock:
+            self.calls[endpoint] += 1
+            return sum(self.calls.values())
+
+    def branch_tips(self):
+        """
+        Get a dict of branch name -> tip sha
+        """
+        repo = git.Repo(self.git_dir)
+        return {head.name: head.commit.hexsha for head in repo.heads}
+
+    def listing(self, revisions, since=None, until=None, author=None, path=None):
+        """
+        Get the (commit, parents) pairs reachable from revisions, newest first,
+        optionally only those whose author name or email is author and those
+        changing files under path
+
+        Returns:
+            Listing, read from git as far as pages are requested and kept for
+            later requests
+        """
+        key = (tuple(revisions), since, until, author, path)
+        with self._lock:
+            listing = self._listings.get(key)
+            if listing is None:
+                # git's default order streams; --date-order would walk the whole history first
+                options = []
+                if since:
+                    options.append(f"--since=@{int(since.timestamp())}")
+                if until:
+                    options.append(f"--until=@{int(until.timestamp())}")
+                commits = iter_git_log(self.git_dir, list(revisions), options, with_parents=True,
+                                       paths=[path] if path else None)
+                if author:
+                    author = author.lower()
+                    commits = (
+                        (commit, parents) for commit, parents in commits
+                        if author in (commit.author_name.lower(), commit.author_email.lower())
+                    )
+                listing = self._listings[key] = Listing(commits, self._commits)
+        return listing
+
+    def commit(self, sha):
+        """
+        Get (commit, parents) for one sha, or None if the repository doesn't have it
+        """
+        with self._lock:
+            found = self._commits.get(sha)
+        if found is None:
+            try:
+                found = next(iter_git_log(self.git_dir, sha, ['-1'], with_parents=True), None)
+            except git.GitCommandError:
+                return None
+        return found
+
+
+class Listing:
+    """
+    Commit listing read lazily from a git log stream, so paging through the
+    newest commits of a large history doesn't read all of it
+    """
+
+    def __init__(self, commits, index):
+        """
+        Args:
+            commits: Iterator of (commit, parents) pairs
+            index: Dict of sha -> (commit, parents) to add the read commits to
+        """
+        self._commits = commits
+        self._index = index
+        self._items = []
+        self._exhausted = False
+        self._lock = threading.Lock()
+
+    def slice(self, start, stop):
+        """
+        Get (items from start to stop, whether more items follow)
+        """
+        with self._lock:
+            # One extra item tells whether there is a next page
+            while not self._exhausted and len(self._items) <= stop:
+                item = next(self._commits, None)
+                if item is None:
+                    self._exhausted = True
+                    break
+                self._items.append(item)
+                self._index[item[0].commit_hash] = item
+            return self._items[start:stop], len(self._items) > stop
+
+
+class StandInRequestHandler(BaseHTTPRequestHandler):
+    """
+    Request handler of ProviderStandIn; standin is set on a subclass per server
+    """
+    protocol_version = 'HTTP/1.1'
+    standin = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        self.query = parse_qs(url.query)
+        self.base_url = f"http://{self.headers['Host']}"
+        self.request_path = url.path.rstrip('/')
+
+        for prefix in BITBUCKET_PREFIXES:
+            if self.request_path.startswith(prefix):
+                return self._route(BITBUCKET_ROUTES, self.request_path[len(prefix):], 'bitbucket')
+        return self._route(GITHUB_ROUTES, self.request_path, 'github')
+
+    def _route(self, routes, path, provider):
+        for endpoint, pattern in routes:
+            match = pattern.fullmatch(path)
+            if match:
+                calls = self.standin.count_call(endpoint)
+                handler = getattr(self, endpoint.replace(':', '_'))
+                params = {name: unquote(value) for name, value in match.groupdict().items() if value is not None}
+                return handler(calls, **params)
+        calls = self.standin.count_call(f"{provider}:unknown")
+        return self._not_found(provider, calls)
+
+    # Responses
+
+    def _send_json(self, provider, calls, body, status=200, headers=None):
+        content = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(content)))
+        for name, value in self._rate_limit_headers(provider, calls).items():
+            self.send_header(name, value)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(content)
+
+    def _rate_limit_headers(self, provider, calls):
+        limit = self.standin.rate_limit
+        if provider == 'github':
+            reset = int(datetime.now(timezone.utc).timestamp()) + 3600
+            return {
+                'X-RateLimit-Limit': str(limit),
+                'X-RateLimit-Remaining': str(max(limit - calls, 0)),
+                'X-RateLimit-Used': str(calls),
+                'X-RateLimit-Reset': str(reset),
+                'X-RateLimit-Resource': 'core',
+            }
+        return {
+            'X-RateLimit-Limit': str(limit),
+            'X-RateLimit-Resource': 'api-repo',
+            'X-RateLimit-NearLimit': str(calls > limit * 0.95).lower(),
+        }
+
+    def _not_found(self, provider, calls):
+        if provider == 'github':
+            body = {'message': 'Not Found', 'documentation_url': 'https://docs.github.com/rest'}
+        else:
+            body = {'type': 'error', 'error': {'message': 'Resource not found'}}
+        self._send_json(provider, calls, body, status=404)
+
+    def _page(self, items, size_param, default_size, max_size):
+        """
+        Get (page items, page number, next page URL or None) for a paginated listing
+        """
+        try:
+            size = min(max(int(self.query.get(size_param, [default_size])[0]), 1), max_size)
+            page = max(int(self.query.get('page', [1])[0]), 1)
+        except ValueError:
+            size, page = default_size, 1
+        chunk, more = _slice(items, (page - 1) * size, page * size)
+        next_url = None
+        if more:
+            params = [(key, value) for key, values in self.query.items() if key != 'page' for value in values]
+            next_url = f"{self.base_url}{self.path.split('?')[0]}?{urlencode(params + [('page', page + 1)])}"
+        return chunk, page, next_url
+
+    def _github_page(self, calls, items, render):
+        chunk, _, next_url = self._page(items, 'per_page', GITHUB_DEFAULT_PAGE_SIZE, GITHUB_MAX_PAGE_SIZE)
+        headers = {}
+        if next_url:
+            headers['Link'] = f'<{next_url}>; rel="next"'
+        self._send_json('github', calls, [render(item) for item in chunk], headers=headers)
+
+    def _bitbucket_page(self, calls, items, render, default_size=BITBUCKET_DEFAULT_PAGE_SIZE,
+                        max_size=BITBUCKET_MAX_PAGE_SIZE):
+        chunk, page, next_url = self._page(items, 'pagelen', default_size, max_size)
+        body = {
+            'pagelen': len(chunk),
+            'page': page,
+            'values': [render(item) for item in chunk],
+        }
+        if next_url:
+            body['next'] = next_url
+        self._send_json('bitbucket', calls, body)
+
+    def _date_param(self, name):
+        value = self.query.get(name, [None])[0]
+        if not value:
+            return None
+        return datetime.fromisoformat(value.replace('Z', '+00:00'))
+
+    # GitHub
+
+    def _github_commit(self, commit, parents, details=False):
+        # /repos/{owner}/{repo}
+        repo_url = self.base_url + '/'.join(self.request_path.split('/')[:4])
+        person = {'name': commit.author_name, 'email': commit.author_email, 'date': _iso(commit.date)}
+        body = {
+            'sha': commit.commit_hash,
+            'url': f"{repo_url}/commits/{commit.commit_hash}",
+            'commit': {
+                'author': person,
+                'committer': person,
+                'message': commit.message,
+            },
+            'author': None,
+            'committer': None,
+            'parents': [{'sha': parent, 'url': f"{repo_url}/commits/{parent}"} for parent in parents],
+        }
+        if details:
+            body['stats'] = {
+                'additions': len(commit.files_changed),
+                'deletions': len(commit.files_changed),
+                'total': 2 * len(commit.files_changed),
+            }
+            body['files'] = [
+                {'filename': path, 'status': 'modified', 'additions': 1, 'deletions': 1, 'changes': 2}
+                for path in commit.files_changed
+            ]
+        return body
+
+    def github_repository(self, calls, owner, repo):
+        self._send_json('github', calls, {
+            'name': repo,
+            'full_name': f"{owner}/{repo}",
+            'url': f"{self.base_url}/repos/{owner}/{repo}",
+            'default_branch': 'main',
+        })
+
+    def github_branches(self, calls):
+        tips = sorted(self.standin.branch_tips().items())
+        self._github_page(calls, tips, lambda tip: {'name': tip[0], 'commit': {'sha': tip[1]}})
+
+    def github_branch(self, calls, branch):
+        tips = self.standin.branch_tips()
+        if branch not in tips:
+            return self._not_found('github', calls)
+        self._send_json('github', calls, {'name': branch, 'commit': {'sha': tips[branch]}})
+
+    def github_commits(self, calls):
+        revision = self.query.get('sha', ['main'])[0]
+        if revision not in self.standin.branch_tips() and self.standin.commit(revision) is None:
+            return self._not_found('github', calls)
+        listing = self.standin.listing(
+            [revision],
+            self._date_param('since'),
+            self._date_param('until'),
+            self.query.get('author', [None])[0],
+            self.query.get('path', [None])[0]
+        )
+        self._github_page(calls, listing, lambda item: self._github_commit(*item))
+
+    def github_commit(self, calls, sha):
+        found = self.standin.commit(sha)
+        if found is None:
+            return self._not_found('github', calls)
+        self._send_json('github', calls, self._github_commit(*found, details=True))
+
+    # Bitbucket
+
+    def _bitbucket_commit(self, commit, parents):
+        return {
+            'type': 'commit',
+            'hash': commit.commit_hash,
+            'date': _iso(commit.date),
+            'message': commit.message,
+            'author': {'type': 'author', 'raw': f"{commit.author_name} <{commit.author_email}>"},
+            'parents': [{'type': 'commit', 'hash': parent} for parent in parents],
+        }
+
+    def _bitbucket_ref(self, name, sha):
+        return {'type': 'branch', 'name': name, 'target': {'type': 'commit', 'hash': sha}}
+
+    def bitbucket_repository(self, calls, workspace, repo):
+        self._send_json('bitbucket', calls, {
+            'type': 'repository',
+            'full_name': f"{workspace}/{repo}",
+            'mainbranch': {'type': 'branch', 'name': 'main'},
+        })
+
+    def bitbucket_branches(self, calls):
+        tips = sorted(self.standin.branch_tips().items())
+        self._bitbucket_page(calls, tips, lambda tip: self._bitbucket_ref(*tip))
+
+    def bitbucket_branch(self, calls, branch):
+        tips = self.standin.branch_tips()
+        if branch not in tips:
+            return self._not_found('bitbucket', calls)
+        self._send_json('bitbucket', calls, self._bitbucket_ref(branch, tips[branch]))
+
+    def bitbucket_commits(self, calls, revision=None):
+        revisions = [revision] if revision else self.query.get('include', [])
+        tips = self.standin.branch_tips()
+        if not revisions or any(name not in tips and self.standin.commit(name) is None for name in revisions):
+            return self._not_found('bitbucket', calls)
+        listing = self.standin.listing(revisions, path=self.query.get('path', [None])[0])
+        self._bitbucket_page(calls, listing, lambda item: self._bitbucket_commit(*item))
+
+    def bitbucket_diffstat(self, calls, sha):
+        found = self.standin.commit(sha)
+        if found is None:
+            return self._not_found('bitbucket', calls)
+        paths = found[0].files_changed
+        self._bitbucket_page(calls, paths, lambda path: {
+            'type': 'diffstat',
+            'status': 'modified',
+            'lines_added': 1,
+            'lines_removed': 1,
+            'old': {'path': path, 'type': 'commit_file'},
+            'new': {'path': path, 'type': 'commit_file'},
+        }, default_size=BITBUCKET_DIFFSTAT_PAGE_SIZE, max_size=BITBUCKET_DIFFSTAT_PAGE_SIZE)
+
+
+def _slice(items, start, stop):
+    if isinstance(items, Listing):
+        return items.slice(start, stop)
+    return items[start:stop], len(items) > stop
+
+
+def _iso(date):
+    return date.astimezone(timezone.utc).isoformat().replace('+00:00', 'Z')
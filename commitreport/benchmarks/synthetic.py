@@ -0,0 +1,169 @@
+import os
+import json
+import random
+import shutil
+import subprocess
+from datetime import datetime, timedelta, timezone
+
+# Commit i is dated FIRST_COMMIT_DATE + i * COMMIT_INTERVAL
+FIRST_COMMIT_DATE = datetime(2020, 1, 1, tzinfo=timezone.utc)
+COMMIT_INTERVAL = timedelta(minutes=10)
+
+SPEC_FILE = 'benchmark-spec.json'
+
+
+class RepositorySpec:
+    """
+    Shape of a generated benchmark repository
+
+    The same spec always produces the same history (hashes included), so
+    results of one size can be compared across runs and machines.
+    """
+
+    def __init__(self, commits, branches=8, files=2000, directories=20, files_per_commit=3,
+                 authors=25, seed=1):
+        """
+        Args:
+            commits: Total number of commits
+            branches: Number of feature branches besides main; every other one is merged back
+            files: Number of distinct file paths
+            directories: Top-level directories the files are spread over
+            files_per_commit: Files changed by each commit
+            authors: Number of distinct authors
+            seed: Random seed
+        """
+        self.commits = commits
+        self.branches = branches
+        self.files = files
+        self.directories = directories
+        self.files_per_commit = files_per_commit
+        self.authors = authors
+        self.seed = seed
+
+    def as_dict(self):
+        return dict(vars(self))
+
+    def commit_date(self, index):
+        """
+        Get the author and committer date of the index-th commit
+        """
+        return FIRST_COMMIT_DATE + index * COMMIT_INTERVAL
+
+
+def generate_repository(path, spec):
+    """
+    Create a git repository with the history described by spec, unless path already holds it
+
+    The history is written with a single `git fast-import`, so even a million
+    commits take minutes rather than hours. Nothing is checked out.
+
+    Args:
+        path: Directory of the repository
+        spec: RepositorySpec
+
+    Returns:
+        True if the repository was (re)generated, False if it was reused
+    """
+    spec_path = os.path.join(path, '.git', SPEC_FILE)
+    if os.path.exists(spec_path):
+        with open(spec_path) as f:
+            if json.load(f) == spec.as_dict():
+                return False
+        shutil.rmtree(path)
+
+    os.makedirs(path, exist_ok=True)
+    subprocess.run(['git', 'init', '-q', path], check=True)
+    subprocess.run(['git', '-C', path, 'symbolic-ref', 'HEAD', 'refs/heads/main'], check=True)
+
+    process = subprocess.Popen(
+        ['git', '-C', path, 'fast-import', '--quiet', '--done'],
+        stdin=subprocess.PIPE
+    )
+    try:
+        for chunk in _fast_import_stream(spec):
+            process.stdin.write(chunk)
+        process.stdin.close()
+    finally:
+        if process.wait() != 0:
+            raise RuntimeError(f"git fast-import failed for {path}")
+
+    with open(spec_path, 'w') as f:
+        json.dump(spec.as_dict(), f)
+    return True
+
+
+def _fast_import_stream(spec):
+    """
+    Yield the fast-import commands for a spec
+
+    Main gets most commits. Feature branches fork from main at evenly spaced
+    points and get commits interleaved with main's for a while; every other
+    branch is then merged back into main.
+    """
+    rng = random.Random(spec.seed)
+    paths = [
+        f"dir{index % spec.directories:02d}/module{index // spec.directories % 10}/file{index}.txt"
+        for index in range(spec.files)
+    ]
+    authors = [(f"Author {index}", f"author{index}@example.com") for index in range(spec.authors)]
+
+    # Branch b forks at forks[b] and receives commits until forks[b] + span
+    span = max(2, spec.commits // (spec.branches + 2) // 2)
+    forks = [(index + 1) * spec.commits // (spec.branches + 2) for index in range(spec.branches)]
+    names = [f"feature-{index:03d}" for index in range(spec.branches)]
+
+    tips = {}
+    active = []
+    for index in range(spec.commits):
+        for branch, fork in enumerate(forks):
+            if fork == index and 'main' in tips:
+                tips[names[branch]] = tips['main']
+                active.append(branch)
+
+        merge = None
+        ended = [branch for branch in active if index >= forks[branch] + span]
+        for branch in ended:
+            active.remove(branch)
+            if branch % 2 == 0 and merge is None:
+                merge = names[branch]
+
+        if merge is None and active and rng.random() < 0.5:
+            ref = names[rng.choice(active)]
+        else:
+            ref = 'main'
+
+        name, email = authors[rng.randrange(len(authors))]
+        timestamp = int(spec.commit_date(index).timestamp())
+        changed = rng.sample(paths, min(spec.files_per_commit, len(paths)))
+        if merge:
+            message = f"Merge branch '{merge}'\n"
+        elif index % 7 == 0:
+            message = f"Update {changed[0]}\n\nRewrites {len(changed)} files as part of change {index}.\n"
+        else:
+            message = f"Change {index}: update {changed[0]}\n"
+
+        lines = [
+            f"commit refs/heads/{ref}",
+            f"mark :{index + 1}",
+            f"author {name} <{email}> {timestamp} +0000",
+            f"committer {name} <{email}> {timestamp} +0000",
+        ]
+        command = '\n'.join(lines).encode() + b'\n' + _data(message.encode())
+        if ref in tips:
+            command += f"from {tips[ref]}\n".encode()
+        if merge:
+            command += f"merge {tips[merge]}\n".encode()
+        for changed_path in changed:
+            command += f"M 100644 inline {changed_path}\n".encode() + _data(f"{changed_path} at change {index}\n".encode())
+        yield command + b'\n'
+        tips[ref] = f":{index + 1}"
+
+    # Branches that never got a commit of their own still point at their fork
+    for branch, name in enumerate(names):
+        if name in tips:
+            yield f"reset refs/heads/{name}\nfrom {tips[name]}\n\n".encode()
+    yield b'done\n'
+
+
+def _data(content):
+    return f"data {len(content)}\n".encode() + content + b'\n'
@@ -0,0 +1,86 @@
+from django.conf import settings
+from django.utils import timezone
+from rest_framework import ISO_8601, serializers
+from rest_framework.settings import api_settings
+from rest_framework.utils.encoders import JSONEncoder
+
+SHORT_SEPARATORS = (',', ':')
+LONG_SEPARATORS = (', ', ': ')
+
+
+class CommitEncoder:
+    """
+    Bulk encoder for CommitRecords, used instead of CommitSerializer for output
+
+    Produces the same data as CommitSerializer, and encode() the same bytes as
+    JSONRenderer, without running every commit through the DRF field machinery:
+    the services' records are trusted, so there is nothing to validate, and
+    the renderer settings and timezone are looked up once per encoder instead
+    of once per field. Create one per response; the current timezone is read
+    when the encoder is created.
+    """
+
+    def __init__(self):
+        self.timezone = timezone.get_current_timezone() if settings.USE_TZ else None
+        self.iso_dates = self.timezone is not None and (api_settings.DATETIME_FORMAT or '').lower() == ISO_8601
+        # Dates the fast path doesn't cover are formatted as the serializer does
+        self._date_field = serializers.DateTimeField()
+        self._json = JSONEncoder(
+            ensure_ascii=not api_settings.UNICODE_JSON,
+            allow_nan=not api_settings.STRICT_JSON,
+            separators=SHORT_SEPARATORS if api_settings.COMPACT_JSON else LONG_SEPARATORS
+        )
+
+    def format_date(self, value):
+        """
+        Format a commit date as CommitSerializer's DateTimeField does
+        """
+        if self.iso_dates and value.tzinfo is not None:
+            value = value.astimezone(self.timezone).isoformat()
+            if value.endswith('+00:00'):
+                value = value[:-6] + 'Z'
+            return value
+        return self._date_field.to_representation(value)
+
+    def data(self, commit):
+        """
+        Get the fields of a CommitRecord as CommitSerializer(commit).data would
+
+        Returns:
+            Dict of JSON-ready values, in serializer field order
+        """
+        data = {
+            'commit_hash': commit.commit_hash,
+            'author_name': commit.author_name,
+            'author_email': commit.author_email,
+            'date': self.format_date(commit.date) if commit.date is not None else None,
+            'message': commit.message,
+            'files_changed': list(commit.files_changed),
+        }
+        branches = getattr(commit, 'branches', None)
+        if branches is not None:
+            data['branches'] = list(branches)
+        return data
+
+    def data_list(self, commits):
+        """
+        Get the fields of many CommitRecords, as CommitSerializer(commits, many=True).data would
+        """
+        return [self.data(commit) for commit in commits]
+
+    def encode(self, commit):
+        """
+        Encode one CommitRecord as JSONRenderer().render(CommitSerializer(commit).data) would
+
+        Returns:
+            UTF-8 JSON bytes
+        """
+        return self.render(self.data(commit))
+
+    def render(self, data):
+        """
+        Encode JSON-ready data as JSONRenderer would without an indent
+        """
+        ret = self._json.encode(data)
+        # Same escaping as JSONRenderer: keep the output a strict JavaScript subset
+        return ret.replace('\u2028', '\\u2028').replace('\u2029', '\\u2029').encode()
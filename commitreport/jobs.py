@@ -0,0 +1,207 @@
+import logging
+import json
+import time
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from datetime import timedelta
+from django.db import connections, transaction, IntegrityError
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from .models import ReportJob
+from .encoders import CommitEncoder
+from .reports import report_page, page_fields, report_summary, report_key
+
+logger = logging.getLogger(__name__)
+
+# Seconds between database checks while long-polling a job run by another process
+POLL_INTERVAL = 1.0
+
+# Error stored on a job whose heartbeats stopped
+ABANDONED_ERROR = "The report job was abandoned: the process running it stopped"
+
+_executor = None
+_submit_lock = threading.Lock()
+# Job id -> threading.Event set when a job run by this process finishes
+_finished_events = {}
+
+
+def get_job_executor():
+    """
+    Get the process-wide worker pool that runs report jobs (settings.REPORT_JOB_WORKERS threads)
+
+    Also starts the thread sending the heartbeats of this process's jobs.
+    """
+    global _executor
+    with _submit_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.REPORT_JOB_WORKERS,
+                thread_name_prefix='report-job'
+            )
+            threading.Thread(target=_send_heartbeats, name='report-job-heartbeat', daemon=True).start()
+    return _executor
+
+
+def _send_heartbeats():
+    while True:
+        time.sleep(settings.REPORT_JOB_HEARTBEAT)
+        job_ids = list(_finished_events)
+        if not job_ids:
+            continue
+        try:
+            ReportJob.objects.filter(id__in=job_ids, active_key__isnull=False).update(heartbeat_at=timezone.now())
+        except Exception:
+            logger.exception("Report job heartbeat failed")
+        finally:
+            connections.close_all()
+
+
+def expire_abandoned_jobs(**filters):
+    """
+    Fail the pending or running jobs that missed their heartbeats for settings.REPORT_JOB_LEASE seconds
+
+    Args:
+        filters: Further ReportJob filters, e.g. id or dedup_key
+
+    Returns:
+        Number of jobs failed
+    """
+    now = timezone.now()
+    expired = ReportJob.objects.filter(
+        active_key__isnull=False,
+        heartbeat_at__lt=now - timedelta(seconds=settings.REPORT_JOB_LEASE),
+        **filters
+    ).update(
+        status=ReportJob.STATUS_FAILED,
+        error=ABANDONED_ERROR,
+        finished_at=now,
+        active_key=None
+    )
+    if expired:
+        logger.warning("Failed %d abandoned report jobs", expired)
+    return expired
+
+
+def _to_json(data):
+    # Round-trip through the API renderer so stored JSON matches what views return
+    return json.loads(JSONRenderer().render(data))
+
+
+def submit_report_job(data):
+    """
+    Queue a report, or join an identical one already in flight
+
+    Args:
+        data: Validated data from CommitRequestSerializer
+
+    Returns:
+        (job, created) tuple; created is False when an in-flight job with the
+        same report key was returned instead
+
+    Only jobs whose process is still sending heartbeats are joined, by this
+    or any other process sharing the database; abandoned ones are failed first.
+    """
+    # Different pages of one report are different jobs
+    page = _to_json({'limit': data.get('limit'), 'cursor': data.get('cursor')})
+    dedup_key = hashlib.sha256(f"{report_key(data)}:{json.dumps(page, sort_keys=True)}".encode('utf-8')).hexdigest()
+    params = _to_json({key: value for key, value in data.items() if key != 'auth_token'})
+    executor = get_job_executor()
+
+    while True:
+        expire_abandoned_jobs(dedup_key=dedup_key)
+        try:
+            with _submit_lock, transaction.atomic():
+                job = ReportJob.objects.create(
+                    dedup_key=dedup_key,
+                    active_key=dedup_key,
+                    params=params,
+                    heartbeat_at=timezone.now()
+                )
+                _finished_events[job.id] = threading.Event()
+            break
+        except IntegrityError:
+            # Another request started the same report first
+            job = ReportJob.objects.filter(active_key=dedup_key).first()
+            if job is not None:
+                return job, False
+            # ...and it finished since; start a new one
+
+    # The auth token is only held in memory, by the worker
+    transaction.on_commit(lambda: executor.submit(run_report_job, job.id, data))
+    return job, True
+
+
+def run_report_job(job_id, data):
+    """
+    Run a queued report job and store its result or error
+    """
+    try:
+        started = ReportJob.objects.filter(id=job_id, status=ReportJob.STATUS_PENDING).update(
+            status=ReportJob.STATUS_RUNNING,
+            started_at=timezone.now()
+        )
+        if not started:
+            # Failed as abandoned while it was queued
+            return
+        try:
+            page = report_page(data)
+            commits = list(page)
+            result = dict(
+                report_summary(data),
+                commits_count=len(commits),
+                commits=CommitEncoder().data_list(commits),
+                **page_fields(page)
+            )
+            ReportJob.objects.filter(id=job_id).update(
+                status=ReportJob.STATUS_SUCCEEDED,
+                result=_to_json(result),
+                finished_at=timezone.now(),
+                active_key=None
+            )
+        except Exception as e:
+            error = str(e) if isinstance(e, ValueError) else f"An unexpected error occurred: {str(e)}"
+            logger.warning("Report job %s failed: %s", job_id, error)
+            ReportJob.objects.filter(id=job_id).update(
+                status=ReportJob.STATUS_FAILED,
+                error=error,
+                finished_at=timezone.now(),
+                active_key=None
+            )
+    finally:
+        connections.close_all()
+        event = _finished_events.pop(job_id, None)
+        if event is not None:
+            event.set()
+
+
+def wait_for_job(job_id, timeout=0):
+    """
+    Get a job, waiting up to timeout seconds for it to finish
+
+    Args:
+        job_id: ReportJob id
+        timeout: Seconds to wait, capped at settings.REPORT_JOB_MAX_WAIT
+
+    Returns:
+        ReportJob
+
+    Raises:
+        ReportJob.DoesNotExist: If there is no such job
+    """
+    deadline = time.monotonic() + min(max(timeout, 0), settings.REPORT_JOB_MAX_WAIT)
+    while True:
+        job = ReportJob.objects.get(id=job_id)
+        if not job.finished and job.id not in _finished_events and expire_abandoned_jobs(id=job.id):
+            job.refresh_from_db()
+        remaining = deadline - time.monotonic()
+        if job.finished or remaining <= 0:
+            return job
+
+        event = _finished_events.get(job.id)
+        if event is not None:
+            event.wait(remaining)
+        else:
+            # Run by another process; check the database periodically
+            time.sleep(min(POLL_INTERVAL, remaining))
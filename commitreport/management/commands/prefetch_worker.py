@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+from commitreport.prefetch import PrefetchScheduler
+
+
+class Command(BaseCommand):
+    help = (
+        "Keep tracked repositories warm: fetch mirrors, ingest the commit index and revalidate "
+        "provider API pages as each repository's refresh interval comes due"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true',
+                            help="Refresh the repositories due now, then exit")
+        parser.add_argument('--concurrency', type=int,
+                            help="Repositories refreshed at once (default: PREFETCH_CONCURRENCY)")
+        parser.add_argument('--poll-interval', type=float,
+                            help="Seconds between checks for due repositories (default: PREFETCH_POLL_INTERVAL)")
+
+    def handle(self, *args, **options):
+        scheduler = PrefetchScheduler(
+            concurrency=options['concurrency'],
+            poll_interval=options['poll_interval']
+        )
+        try:
+            refreshed = scheduler.run(once=options['once'])
+        except KeyboardInterrupt:
+            scheduler.stop()
+            self.stdout.write("Stopped")
+            return
+        self.stdout.write(self.style.SUCCESS(f"Refreshed {refreshed} repositories"))
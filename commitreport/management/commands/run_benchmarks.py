@@ -0,0 +1,85 @@
+import os
+import json
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from commitreport.benchmarks.runner import (
+    SIZES, CASES, API_COMMITS, BASELINES_PATH, run_benchmarks, load_baselines, save_baselines, compare
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the commit services, serialization and /api/commits/ on generated repositories, "
+        "with local stand-ins for the GitHub and Bitbucket APIs, and compare with stored baselines"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='10k',
+                            help=f"Comma-separated repository sizes: {', '.join(SIZES)} (default: 10k)")
+        parser.add_argument('--cases', default=','.join(CASES),
+                            help=f"Comma-separated cases (default: all of {', '.join(CASES)})")
+        parser.add_argument('--branches', type=int, default=8, help="Feature branches per repository")
+        parser.add_argument('--files', type=int, default=2000, help="Distinct file paths per repository")
+        parser.add_argument('--api-commits', type=int, default=API_COMMITS,
+                            help="Newest commits read by the GitHub and Bitbucket cases")
+        parser.add_argument('--workdir', default=os.path.join(settings.BASE_DIR, 'benchmark_repos'),
+                            help="Where generated repositories are kept between runs")
+        parser.add_argument('--baselines', default=BASELINES_PATH, help="Baselines JSON file")
+        parser.add_argument('--update-baselines', action='store_true',
+                            help="Store these results as the new baselines")
+        parser.add_argument('--check', action='store_true', help="Exit with an error on regressions")
+        parser.add_argument('--in-process', action='store_true',
+                            help="Run cases in this process (faster, but peak RSS accumulates)")
+        parser.add_argument('--output', help="Also write the results to this JSON file")
+
+    def handle(self, *args, **options):
+        try:
+            sizes = {name: SIZES[name] for name in options['sizes'].split(',')}
+        except KeyError as e:
+            raise CommandError(f"Unknown size {e}; choose from {', '.join(SIZES)}")
+        cases = options['cases'].split(',')
+        unknown = [case for case in cases if case not in CASES]
+        if unknown:
+            raise CommandError(f"Unknown case {', '.join(unknown)}; choose from {', '.join(CASES)}")
+
+        os.makedirs(options['workdir'], exist_ok=True)
+        results = run_benchmarks(
+            sizes,
+            cases,
+            workdir=options['workdir'],
+            branches=options['branches'],
+            files=options['files'],
+            api_commits=options['api_commits'],
+            isolate=not options['in_process'],
+            report=self.stdout.write
+        )
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(results, f, indent=2)
+
+        baselines = load_baselines(options['baselines'])
+        self.stdout.write("")
+        self.stdout.write(f"{'size':<6} {'case':<18} {'commits':>8} {'wall s':>9} {'base':>9} "
+                          f"{'RSS MB':>8} {'base':>8} {'calls':>6} {'base':>6}")
+        for result in results:
+            baseline = baselines.get(result['size'], {}).get(result['case'], {})
+            self.stdout.write(
+                f"{result['size']:<6} {result['case']:<18} {result['commits']:>8} "
+                f"{result['wall_s']:>9} {baseline.get('wall_s', '-'):>9} "
+                f"{result['peak_rss_mb']:>8} {baseline.get('peak_rss_mb', '-'):>8} "
+                f"{result['api_calls']:>6} {baseline.get('api_calls', '-'):>6}"
+            )
+
+        if options['update_baselines']:
+            save_baselines(results, options['baselines'])
+            self.stdout.write(self.style.SUCCESS(f"Baselines updated in {options['baselines']}"))
+            return
+
+        regressions = compare(results, baselines)
+        for regression in regressions:
+            self.stdout.write(self.style.WARNING(f"Regression: {regression}"))
+        if regressions and options['check']:
+            raise CommandError(f"{len(regressions)} benchmark regression(s)")
+        if not regressions:
+            self.stdout.write(self.style.SUCCESS("No regressions against the baselines"))
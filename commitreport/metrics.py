@@ -0,0 +1,300 @@
+import time
+import threading
+import contextvars
+from collections import Counter
+from contextlib import contextmanager
+
+# Histogram buckets in seconds, from a cached lookup to a large clone
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+# name -> (type, help, label names); exported with a 'commitreport_' prefix
+METRICS = {
+    'request_duration_seconds': (
+        'histogram', "Time to serve a report request, until the last byte for streamed responses",
+        ('endpoint', 'provider')),
+    'phase_duration_seconds': (
+        'histogram', "Time spent in one phase of a report, e.g. queue-wait, fetch, walk, pagination, diffs or serialize",
+        ('provider', 'phase')),
+    'commits_walked_total': (
+        'counter', "Commits read from git, a provider API or the commit index", ('provider',)),
+    'commits_returned_total': (
+        'counter', "Commits that passed the filters and were returned", ('provider',)),
+    'api_calls_total': (
+        'counter', "Requests sent to the GitHub and Bitbucket APIs", ('provider',)),
+    'cloned_bytes_total': (
+        'counter', "Bytes added to git mirrors by clones and fetches", ()),
+    'cache_hits_total': (
+        'counter', "Lookups answered by a cache: mirror, http, report or index", ('cache',)),
+    'cache_misses_total': (
+        'counter', "Lookups a cache could not answer", ('cache',)),
+    'fetches_shared_total': (
+        'counter', "Mirror fetches skipped because a request waiting alongside had just fetched", ()),
+    'git_queued_fetches': (
+        'gauge', "Clones and fetches waiting for a free slot in this process", ()),
+    'prefetch_runs_total': (
+        'counter', "Background refreshes of tracked repositories, by outcome", ('status',)),
+    'webhook_deliveries_total': (
+        'counter', "Push webhook deliveries: applied, ignored (other events), invalid or rejected (bad signature)",
+        ('provider', 'outcome')),
+}
+
+
+class MetricsRegistry:
+    """
+    Process-wide counters, gauges and histograms, rendered in the Prometheus text format
+
+    Each worker process keeps its own values; scrape every process, or run a
+    single one, to see them all.
+    """
+
+    def __init__(self, buckets=DURATION_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._counters = {}
+        # (name, label values) -> [count per bucket, sum, count]
+        self._histograms = {}
+
+    def _key(self, name, labels):
+        return name, tuple(str(labels.get(label, '')) for label in METRICS[name][2])
+
+    def inc(self, name, amount=1, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def observe(self, name, value, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = [[0] * len(self.buckets), 0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    histogram[0][index] += 1
+            histogram[1] += value
+            histogram[2] += 1
+
+    def render(self):
+        """
+        Get every metric in the Prometheus text exposition format
+        """
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = {key: (list(buckets), total, observed) for key, (buckets, total, observed) in self._histograms.items()}
+
+        lines = []
+        for name, (kind, help_text, label_names) in METRICS.items():
+            full_name = f"commitreport_{name}"
+            lines.append(f"# HELP {full_name} {help_text}")
+            lines.append(f"# TYPE {full_name} {kind}")
+            if kind in ('counter', 'gauge'):
+                for (metric, values), value in sorted(counters.items()):
+                    if metric == name:
+                        lines.append(f"{full_name}{_labels(label_names, values)} {value}")
+                continue
+            for (metric, values), (buckets, total, observed) in sorted(histograms.items()):
+                if metric != name:
+                    continue
+                for bound, bucket_count in zip(self.buckets, buckets):
+                    lines.append(f"{full_name}_bucket{_labels(label_names, values, le=bound)} {bucket_count}")
+                lines.append(f"{full_name}_bucket{_labels(label_names, values, le='+Inf')} {observed}")
+                lines.append(f"{full_name}_sum{_labels(label_names, values)} {total}")
+                lines.append(f"{full_name}_count{_labels(label_names, values)} {observed}")
+        return '\n'.join(lines) + '\n'
+
+
+def _labels(names, values, le=None):
+    pairs = list(zip(names, values))
+    if le is not None:
+        pairs.append(('le', le))
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+REGISTRY = MetricsRegistry()
+
+
+class RequestMetrics:
+    """
+    Phase durations and counters of one request, for its Server-Timing header
+
+    Phases that run more than once (one per commit diff, say) are summed, and
+    phases run concurrently on a thread pool can add up to more than the
+    request's total.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.provider = None
+        self.phases = {}
+        self.counters = Counter()
+        self._lock = threading.Lock()
+
+    def add_phase(self, name, seconds):
+        with self._lock:
+            self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    def add_count(self, name, amount):
+        with self._lock:
+            self.counters[name] += amount
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def server_timing(self):
+        """
+        Get the Server-Timing header value: phases in milliseconds, then counters, then the total
+        """
+        with self._lock:
+            entries = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in self.phases.items()]
+            entries.extend(f'{name};desc="{value}"' for name, value in self.counters.items())
+        entries.append(f"total;dur={self.elapsed() * 1000:.1f}")
+        return ', '.join(entries)
+
+
+_request_metrics = contextvars.ContextVar('commitreport_request_metrics', default=None)
+
+
+def current():
+    """
+    Get the RequestMetrics of the request being served, or None outside a request
+    """
+    return _request_metrics.get()
+
+
+@contextmanager
+def collect(request_metrics=None):
+    """
+    Record the phases and counters of the code run inside the block into a RequestMetrics
+
+    Yields:
+        The RequestMetrics
+    """
+    request_metrics = request_metrics or RequestMetrics()
+    token = _request_metrics.set(request_metrics)
+    try:
+        yield request_metrics
+    finally:
+        _request_metrics.reset(token)
+
+
+def in_context(func):
+    """
+    Wrap func to run in a copy of the current context, so work handed to a
+    thread pool still records into the request's metrics
+    """
+    context = contextvars.copy_context()
+    return lambda *args, **kwargs: context.run(func, *args, **kwargs)
+
+
+def set_provider(provider):
+    """
+    Label the current request with the repository type it reports on; the first label set wins
+    """
+    request_metrics = current()
+    if request_metrics is not None and request_metrics.provider is None:
+        request_metrics.provider = provider
+
+
+def record_phase(name, seconds, provider=None):
+    """
+    Record one run of a phase
+
+    Args:
+        name: Phase name, e.g. 'walk'
+        seconds: Duration
+        provider: 'git', 'github', 'bitbucket', 'index', or None for the
+            request's own repository type
+    """
+    request_metrics = current()
+    if request_metrics is not None:
+        request_metrics.add_phase(f"{provider}-{name}" if provider else name, seconds)
+        provider = provider or request_metrics.provider
+    REGISTRY.observe('phase_duration_seconds', seconds, provider=provider or 'none', phase=name)
+
+
+@contextmanager
+def phase(name, provider=None):
+    """
+    Time the block as one run of a phase
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_phase(name, time.perf_counter() - started, provider)
+
+
+def timed(iterable, name, provider=None, counter=None):
+    """
+    Iterate over iterable, timing only the work of producing its items
+
+    The time the consumer spends between items is left out, so a lazily read
+    git log or API listing can be timed while it is being streamed. It is
+    recorded as one run of the phase when iteration ends or stops early.
+
+    Args:
+        iterable: Items to pass through
+        name: Phase name
+        provider: As for record_phase
+        counter: Name of a counter to add the number of items to, e.g. 'commits_walked'
+
+    Yields:
+        The items of iterable
+    """
+    iterator = iter(iterable)
+    elapsed = 0.0
+    items = 0
+    try:
+        while True:
+            started = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                elapsed += time.perf_counter() - started
+                break
+            elapsed += time.perf_counter() - started
+            items += 1
+            yield item
+    finally:
+        # Stopping early must still stop the underlying reader (e.g. a git process)
+        close = getattr(iterator, 'close', None)
+        if close:
+            close()
+        record_phase(name, elapsed, provider)
+        if counter:
+            count(counter, items, provider=provider)
+
+
+def count(name, amount=1, **labels):
+    """
+    Add to a counter, both process-wide and for the current request
+
+    Args:
+        name: Counter name without the _total suffix, e.g. 'api_calls'
+        amount: Amount to add
+        labels: Label values, e.g. provider='github'
+    """
+    if not amount:
+        return
+    REGISTRY.inc(f"{name}_total", amount, **labels)
+    request_metrics = current()
+    if request_metrics is not None:
+        request_metrics.add_count(name, amount)
+
+
+def record_request(request_metrics, endpoint):
+    """
+    Observe a finished report request in the per-provider latency histogram
+    """
+    REGISTRY.observe(
+        'request_duration_seconds',
+        request_metrics.elapsed(),
+        endpoint=endpoint,
+        provider=request_metrics.provider or 'none'
+    )
@@ -0,0 +1,82 @@
+import contextvars
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from . import metrics
+
+
+class ServerTimingMiddleware:
+    """
+    Collect per-phase timings and counters of report requests
+
+    Report requests (those that named a repository type) get a Server-Timing
+    header with their phases and counters, and their duration is observed in
+    the request latency histogram. For streamed responses the header covers the
+    work done before the first byte, and the duration runs until the last one.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+
+        with metrics.collect() as request_metrics:
+            response = self.get_response(request)
+            # Streamed content is produced after this returns; run it in the request's context
+            context = contextvars.copy_context()
+        return self._finish(request, response, request_metrics, context)
+
+    async def __acall__(self, request):
+        with metrics.collect() as request_metrics:
+            response = await self.get_response(request)
+        return self._finish(request, response, request_metrics)
+
+    def _finish(self, request, response, request_metrics, context=None):
+        if request_metrics.provider is None:
+            return response
+
+        if settings.SERVER_TIMING_HEADER:
+            response['Server-Timing'] = request_metrics.server_timing()
+
+        endpoint = request.resolver_match.url_name if request.resolver_match else 'none'
+        if not response.streaming:
+            metrics.record_request(request_metrics, endpoint)
+        elif response.is_async:
+            response.streaming_content = _async_stream(response.streaming_content, request_metrics, endpoint)
+        else:
+            response.streaming_content = _stream(response.streaming_content, context, request_metrics, endpoint)
+        return response
+
+
+_END = object()
+
+
+def _stream(content, context, request_metrics, endpoint):
+    iterator = iter(content)
+    try:
+        while True:
+            chunk = context.run(next, iterator, _END)
+            if chunk is _END:
+                break
+            yield chunk
+    finally:
+        close = getattr(iterator, 'close', None)
+        if close:
+            context.run(close)
+        metrics.record_request(request_metrics, endpoint)
+
+
+async def _async_stream(content, request_metrics, endpoint):
+    # Async views hand their blocking work to threads with metrics.in_context themselves
+    try:
+        async for chunk in content:
+            yield chunk
+    finally:
+        metrics.record_request(request_metrics, endpoint)
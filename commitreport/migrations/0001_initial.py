@@ -0,0 +1,75 @@
+# Generated by Django 5.2.1 on 2026-10-18 04:57
+
+import django.db.models.deletion
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Branch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255)),
+                ('tip', models.CharField(blank=True, max_length=40)),
+                ('ingested_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Repository',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('url', models.CharField(max_length=500, unique=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Commit',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('commit_hash', models.CharField(db_index=True, max_length=40)),
+                ('author_name', models.CharField(max_length=255)),
+                ('author_email', models.CharField(max_length=255)),
+                ('date', models.DateTimeField()),
+                ('message', models.TextField(blank=True)),
+                ('branches', models.ManyToManyField(related_name='commits', to='commitreport.branch')),
+                ('repository', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='commits', to='commitreport.repository')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='FileChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('path', models.TextField()),
+                ('commit', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='file_changes', to='commitreport.commit')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='branch',
+            name='repository',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='branches', to='commitreport.repository'),
+        ),
+        migrations.AddIndex(
+            model_name='commit',
+            index=models.Index(fields=['repository', 'date'], name='commit_repository_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='commit',
+            index=models.Index(models.F('repository'), django.db.models.functions.text.Lower('author_email'), name='commit_repository_email_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='commit',
+            constraint=models.UniqueConstraint(fields=('repository', 'commit_hash'), name='unique_commit_per_repository'),
+        ),
+        migrations.AddConstraint(
+            model_name='branch',
+            constraint=models.UniqueConstraint(fields=('repository', 'name'), name='unique_branch_per_repository'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.1 on 2026-10-18 06:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('commitreport', '0002_reportjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrackedRepository',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('repo_type', models.CharField(choices=[('local', 'Local'), ('github', 'GitHub'), ('bitbucket', 'Bitbucket')], max_length=10)),
+                ('repo_path', models.CharField(max_length=500)),
+                ('key', models.CharField(max_length=500)),
+                ('branches', models.JSONField(default=list)),
+                ('refresh_interval', models.PositiveIntegerField()),
+                ('enabled', models.BooleanField(default=True)),
+                ('next_run_at', models.DateTimeField(db_index=True)),
+                ('last_run_at', models.DateTimeField(blank=True, null=True)),
+                ('last_success_at', models.DateTimeField(blank=True, null=True)),
+                ('failures', models.PositiveIntegerField(default=0)),
+                ('last_error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('repo_type', 'key'), name='unique_tracked_repository')],
+            },
+        ),
+    ]
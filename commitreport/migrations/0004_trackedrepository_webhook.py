@@ -0,0 +1,23 @@
+# Generated by Django 5.2.1 on 2026-10-18 06:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('commitreport', '0003_trackedrepository'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='trackedrepository',
+            name='webhook_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='trackedrepository',
+            name='webhook_url',
+            field=models.CharField(blank=True, max_length=500),
+        ),
+    ]
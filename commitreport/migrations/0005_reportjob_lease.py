@@ -0,0 +1,33 @@
+# Generated by Django 5.2.1 on 2026-10-18 06:22
+
+from django.db import migrations, models
+
+
+def fail_unleased_jobs(apps, schema_editor):
+    # Jobs in flight before leases existed can't be told apart from abandoned ones
+    ReportJob = apps.get_model('commitreport', 'ReportJob')
+    ReportJob.objects.filter(status__in=['pending', 'running']).update(
+        status='failed',
+        error="The report job was abandoned: the process running it stopped"
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('commitreport', '0004_trackedrepository_webhook'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reportjob',
+            name='active_key',
+            field=models.CharField(blank=True, max_length=64, null=True, unique=True),
+        ),
+        migrations.AddField(
+            model_name='reportjob',
+            name='heartbeat_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(fail_unleased_jobs, migrations.RunPython.noop),
+    ]
@@ -1,3 +1,153 @@
+import uuid
 from django.db import models
+from django.db.models.functions import Lower
 
-# Create your models here.
+
+class Repository(models.Model):
+    """
+    A git repository whose commits are stored in the commit index
+    """
+    # Normalized remote URL, or absolute path for local repositories
+    url = models.CharField(max_length=500, unique=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.url
+
+
+class Branch(models.Model):
+    """
+    A branch of an indexed repository and the last tip ingested for it
+    """
+    repository = models.ForeignKey(Repository, on_delete=models.CASCADE, related_name='branches')
+    name = models.CharField(max_length=255)
+    tip = models.CharField(max_length=40, blank=True)
+    ingested_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['repository', 'name'], name='unique_branch_per_repository'),
+        ]
+
+    def __str__(self):
+        return f"{self.repository}@{self.name}"
+
+
+class Commit(models.Model):
+    """
+    An ingested commit; shared by every branch that contains it
+    """
+    repository = models.ForeignKey(Repository, on_delete=models.CASCADE, related_name='commits')
+    commit_hash = models.CharField(max_length=40, db_index=True)
+    author_name = models.CharField(max_length=255)
+    author_email = models.CharField(max_length=255)
+    date = models.DateTimeField()
+    message = models.TextField(blank=True)
+    branches = models.ManyToManyField(Branch, related_name='commits')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['repository', 'commit_hash'], name='unique_commit_per_repository'),
+        ]
+        indexes = [
+            models.Index(fields=['repository', 'date'], name='commit_repository_date_idx'),
+            # Author filters are case-insensitive, so index the lowercased email
+            models.Index('repository', Lower('author_email'), name='commit_repository_email_idx'),
+        ]
+
+    def __str__(self):
+        return self.commit_hash
+
+
+class FileChange(models.Model):
+    """
+    A path changed by an ingested commit
+    """
+    commit = models.ForeignKey(Commit, on_delete=models.CASCADE, related_name='file_changes')
+    path = models.TextField()
+
+    def __str__(self):
+        return self.path
+
+
+class ReportJob(models.Model):
+    """
+    A commits report run in the background by the job worker pool
+    """
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_SUCCEEDED = 'succeeded'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_SUCCEEDED, 'Succeeded'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    # Hash of the normalized repository, branch, filters and credentials; identical
+    # requests made while a job is in flight are answered with that job
+    dedup_key = models.CharField(max_length=64, db_index=True)
+    # dedup_key while the job is pending or running, None once it finished; being
+    # unique, it lets only one process start a job for a given report
+    active_key = models.CharField(max_length=64, null=True, blank=True, unique=True)
+    # Request parameters without the auth token
+    params = models.JSONField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    # Same body as a synchronous /api/commits/ response
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    # Refreshed by the process holding the job until it finishes
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+
+    @property
+    def finished(self):
+        return self.status in (self.STATUS_SUCCEEDED, self.STATUS_FAILED)
+
+    def __str__(self):
+        return f"{self.id} ({self.status})"
+
+
+class TrackedRepository(models.Model):
+    """
+    A repository the prefetch scheduler keeps fresh, so reports don't wait for fetches
+    """
+    REPO_TYPE_CHOICES = [
+        ('local', 'Local'),
+        ('github', 'GitHub'),
+        ('bitbucket', 'Bitbucket'),
+    ]
+
+    repo_type = models.CharField(max_length=10, choices=REPO_TYPE_CHOICES)
+    # As given when registering, without credentials; private remotes need a git credential helper
+    repo_path = models.CharField(max_length=500)
+    # reports.normalize_repository of repo_path, so each repository is tracked once
+    key = models.CharField(max_length=500)
+    branches = models.JSONField(default=list)
+    # Seconds between refreshes; failing repositories back off beyond it
+    refresh_interval = models.PositiveIntegerField()
+    enabled = models.BooleanField(default=True)
+    next_run_at = models.DateTimeField(db_index=True)
+    last_run_at = models.DateTimeField(null=True, blank=True)
+    last_success_at = models.DateTimeField(null=True, blank=True)
+    # Consecutive failed refreshes
+    failures = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    # Clone URL named by the last verified push webhook, and when it arrived. While
+    # set, pushes keep the commit index of this URL current, and Bitbucket reports
+    # on pushed branches may be answered from it (see reports.webhook_branch)
+    webhook_url = models.CharField(max_length=500, blank=True)
+    webhook_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['repo_type', 'key'], name='unique_tracked_repository'),
+        ]
+
+    def __str__(self):
+        return f"{self.repo_type}:{self.repo_path}"
@@ -0,0 +1,116 @@
+import json
+import base64
+import binascii
+from datetime import datetime
+from .services.records import order_date
+
+
+def encode_cursor(commit):
+    """
+    Build the opaque cursor that resumes a report after a commit
+
+    The date is the one the report is listed and end-date filtered by, which
+    for GitHub is the committer date rather than the reported author date.
+
+    Args:
+        commit: CommitRecord of the last commit on a page
+
+    Returns:
+        URL-safe string
+    """
+    position = {'sha': commit.commit_hash, 'date': order_date(commit).isoformat()}
+    return base64.urlsafe_b64encode(json.dumps(position).encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """
+    Read a cursor made by encode_cursor
+
+    Returns:
+        Dict with the commit 'sha' and its aware 'date'
+
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        position = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        date = datetime.fromisoformat(position['date'])
+        sha = position['sha']
+    except (ValueError, TypeError, KeyError, UnicodeEncodeError, binascii.Error):
+        raise ValueError("Invalid cursor")
+    if not isinstance(sha, str) or date.tzinfo is None:
+        raise ValueError("Invalid cursor")
+    return {'sha': sha, 'date': date}
+
+
+def page_params(data):
+    """
+    Narrow report parameters to what is left after a cursor
+
+    Commits are listed newest first by their order_date, so a page resumes at
+    the cursor's date: services stop walking or paging at end_date, and only
+    the commits sharing the cursor's exact date have to be skipped by CommitPage.
+    """
+    cursor = data.get('cursor')
+    if not cursor:
+        return data
+    end_date = data.get('end_date')
+    if end_date is None or cursor['date'] < end_date:
+        end_date = cursor['date']
+    return dict(data, end_date=end_date)
+
+
+class CommitPage:
+    """
+    One page of a commit stream: up to limit commits following a cursor
+
+    Iterating reads at most limit + 1 commits from the underlying stream; the
+    extra one only tells whether another page follows, after which the stream
+    is closed so git or the API client stops working.
+    """
+
+    def __init__(self, commits, limit, cursor=None):
+        self.commits = commits
+        self.limit = limit
+        self.cursor = cursor
+        self.next_cursor = None
+
+    def __iter__(self):
+        commits = iter(self.commits)
+        try:
+            count = 0
+            last = None
+            for commit in self._after_cursor(commits):
+                if count == self.limit:
+                    self.next_cursor = encode_cursor(last)
+                    break
+                count += 1
+                last = commit
+                yield commit
+        finally:
+            close = getattr(commits, 'close', None)
+            if close:
+                close()
+
+    def _after_cursor(self, commits):
+        if not self.cursor:
+            yield from commits
+            return
+
+        # Commits at the cursor's date come up to and including the cursor
+        # commit. If it is gone (rewritten history), don't drop the others.
+        held = []
+        for commit in commits:
+            if held is None:
+                yield commit
+            elif commit.commit_hash == self.cursor['sha']:
+                held = None
+            elif order_date(commit) >= self.cursor['date']:
+                held.append(commit)
+            else:
+                yield from held
+                held = None
+                yield commit
+        if held:
+            yield from held
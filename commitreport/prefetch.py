@@ -0,0 +1,277 @@
+import logging
+import time
+import random
+import threading
+from datetime import timedelta
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from django.conf import settings
+from django.db import connections
+from django.utils import timezone
+from . import metrics
+from .models import TrackedRepository
+from .reports import normalize_repository
+from .services.git_service import GitService
+from .services.bitbucket_service import BitbucketService
+from .services.commit_index import CommitIndex
+from .services.repo_cache import strip_credentials
+from .webhooks import indexes_pushes
+
+logger = logging.getLogger(__name__)
+
+
+def track_repository(repo_type, repo_path, branches=None, refresh_interval=None):
+    """
+    Register a repository for prefetching, or update its registration
+
+    A newly registered repository is due right away.
+
+    Args:
+        repo_type: 'local', 'github' or 'bitbucket'
+        repo_path: Path or URL as for reports; credentials are dropped
+        branches: Branches to keep fresh, defaults to ['main']
+        refresh_interval: Seconds between refreshes, defaults to settings.PREFETCH_DEFAULT_INTERVAL
+
+    Returns:
+        (tracked, created) tuple
+    """
+    repo_path = strip_credentials(repo_path.strip())
+    interval = max(refresh_interval or settings.PREFETCH_DEFAULT_INTERVAL, settings.PREFETCH_MIN_INTERVAL)
+    return TrackedRepository.objects.update_or_create(
+        repo_type=repo_type,
+        key=normalize_repository(repo_type, repo_path),
+        defaults={
+            'repo_path': repo_path,
+            'branches': branches or ['main'],
+            'refresh_interval': interval,
+            'enabled': True,
+        },
+        create_defaults={
+            'repo_path': repo_path,
+            'branches': branches or ['main'],
+            'refresh_interval': interval,
+            'next_run_at': timezone.now(),
+        }
+    )
+
+
+def refresh_repository(tracked):
+    """
+    Bring what reports on a tracked repository read from up to date
+
+    - local: fetch the mirror (remote URLs) and ingest the branches into the
+      commit index, or only fetch when the index is disabled
+    - bitbucket: fetch the git mirror the service reads first
+    - bitbucket without BITBUCKET_GIT_FIRST: read the branch refs and the
+      listing pages of the branches' commits of the last
+      PREFETCH_API_WINDOW_DAYS days into the HTTP cache. These are the exact
+      URLs a report requests, as Bitbucket listings take no date parameters.
+      Cached responses are keyed by credentials and none are stored, so this
+      serves anonymous reports.
+    - github: skipped. Reports send their own since/until, so no listing
+      request made here would ever be reused, and anonymous requests only
+      use up the 60 an hour GitHub allows.
+    - repositories kept current by push webhooks (see
+      webhooks.indexes_pushes): ingest the branches from the webhook's clone
+      URL, catching up on any missed deliveries
+
+    Raises:
+        ValueError: If the repository can't be fetched
+    """
+    repo_path = tracked.repo_path
+    if tracked.webhook_url and indexes_pushes(tracked.repo_type):
+        index = CommitIndex()
+        for branch in tracked.branches:
+            index.ingest(tracked.webhook_url, branch)
+        return
+
+    if tracked.repo_type == 'local':
+        if settings.COMMIT_INDEX_ENABLED:
+            # The first ingest fetches; the others share that fetch (GIT_MIRROR_FETCH_INTERVAL)
+            index = CommitIndex()
+            for branch in tracked.branches:
+                index.ingest(repo_path, branch)
+        else:
+            GitService().get_repo(repo_path)
+        return
+
+    if tracked.repo_type == 'bitbucket' and settings.BITBUCKET_GIT_FIRST:
+        GitService().get_repo(BitbucketService().git_url(repo_path))
+        return
+
+    if tracked.repo_type == 'github':
+        logger.info("Prefetch of %s skipped: GitHub reports request date-bound listings that can't be warmed", tracked)
+        return
+    if not settings.HTTP_CACHE_ENABLED:
+        logger.info("Prefetch of %s skipped: nothing to keep warm without HTTP_CACHE_ENABLED", tracked)
+        return
+    since = timezone.now() - timedelta(days=settings.PREFETCH_API_WINDOW_DAYS)
+    for branch in tracked.branches:
+        BitbucketService().count_commits(repo_path, branch=branch, start_date=since)
+
+
+def next_delay(interval, failures=0):
+    """
+    Time until the next refresh
+
+    The interval, doubled for every consecutive failure up to
+    PREFETCH_MAX_BACKOFF, and spread by PREFETCH_JITTER (a fraction) either
+    way so that repositories registered together don't refresh in lockstep.
+
+    Returns:
+        timedelta
+    """
+    delay = interval
+    if failures:
+        delay = min(interval * 2 ** min(failures, 20), max(settings.PREFETCH_MAX_BACKOFF, interval))
+    jitter = settings.PREFETCH_JITTER
+    return timedelta(seconds=delay * random.uniform(1 - jitter, 1 + jitter))
+
+
+class PrefetchScheduler:
+    """
+    Refreshes tracked repositories as they become due, a bounded number at a time
+
+    Several schedulers (threads or worker processes) can share one database:
+    a due repository is claimed by moving its next_run_at past a lease with a
+    conditional update, so only one of them refreshes it. A claim whose
+    scheduler died is picked up again once the lease runs out.
+    """
+
+    def __init__(self, concurrency=None, poll_interval=None):
+        """
+        Args:
+            concurrency: Repositories refreshed at once, defaults to settings.PREFETCH_CONCURRENCY
+            poll_interval: Seconds between checks for due repositories, defaults to settings.PREFETCH_POLL_INTERVAL
+        """
+        self.concurrency = concurrency or settings.PREFETCH_CONCURRENCY
+        self.poll_interval = poll_interval or settings.PREFETCH_POLL_INTERVAL
+        self._stop = threading.Event()
+        self._thread = None
+
+    def claim_next(self):
+        """
+        Claim the repository that has been due the longest
+
+        Returns:
+            TrackedRepository, or None if none is due
+        """
+        now = timezone.now()
+        lease = now + timedelta(seconds=settings.PREFETCH_LEASE)
+        due = TrackedRepository.objects.filter(enabled=True, next_run_at__lte=now).order_by('next_run_at')
+        for tracked in due[:self.concurrency]:
+            # Only succeeds if no other scheduler claimed it since it was read
+            claimed = TrackedRepository.objects.filter(pk=tracked.pk, next_run_at=tracked.next_run_at).update(
+                next_run_at=lease,
+                last_run_at=now
+            )
+            if claimed:
+                tracked.next_run_at = lease
+                tracked.last_run_at = now
+                return tracked
+        return None
+
+    def refresh(self, tracked):
+        """
+        Refresh one claimed repository and schedule its next run
+
+        Returns:
+            Error message, or None if the refresh succeeded
+        """
+        started = time.perf_counter()
+        try:
+            refresh_repository(tracked)
+            error = None
+        except ValueError as e:
+            error = str(e)
+        except Exception as e:
+            error = f"An unexpected error occurred: {str(e)}"
+
+        metrics.record_phase('prefetch', time.perf_counter() - started, tracked.repo_type)
+        metrics.count('prefetch_runs', status='error' if error else 'ok')
+        try:
+            now = timezone.now()
+            if error is None:
+                TrackedRepository.objects.filter(pk=tracked.pk).update(
+                    failures=0,
+                    last_error='',
+                    last_success_at=now,
+                    next_run_at=now + next_delay(tracked.refresh_interval)
+                )
+            else:
+                failures = tracked.failures + 1
+                logger.warning("Prefetch of %s failed (%d in a row): %s", tracked, failures, error)
+                TrackedRepository.objects.filter(pk=tracked.pk).update(
+                    failures=failures,
+                    last_error=error,
+                    next_run_at=now + next_delay(tracked.refresh_interval, failures)
+                )
+        finally:
+            # Scheduler threads outlive the refresh; don't leave its database connection open
+            connections.close_all()
+        return error
+
+    def run(self, once=False):
+        """
+        Refresh due repositories until stop() is called
+
+        Args:
+            once: Return as soon as no repository is due or being refreshed
+
+        Returns:
+            Number of refreshes run
+        """
+        refreshed = 0
+        running = set()
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='prefetch') as executor:
+            while not self._stop.is_set():
+                while len(running) < self.concurrency:
+                    tracked = self.claim_next()
+                    if tracked is None:
+                        break
+                    running.add(executor.submit(self.refresh, tracked))
+
+                if not running:
+                    if once:
+                        break
+                    self._stop.wait(self.poll_interval)
+                    continue
+
+                done, running = wait(running, timeout=self.poll_interval, return_when=FIRST_COMPLETED)
+                refreshed += len(done)
+            # Refreshes already started finish before the pool shuts down
+            refreshed += len(running)
+        return refreshed
+
+    def start(self):
+        """
+        Run the scheduler on a daemon thread of this process
+        """
+        if self._thread is None:
+            self._thread = threading.Thread(target=self.run, name='prefetch-scheduler', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """
+        Stop scheduling further refreshes
+        """
+        self._stop.set()
+
+
+_in_process_scheduler = None
+_in_process_lock = threading.Lock()
+
+
+def start_in_process_scheduler():
+    """
+    Start a scheduler inside the serving process if settings.PREFETCH_IN_PROCESS is set
+
+    Called by the WSGI and ASGI entry points. Deployments with several worker
+    processes can run it in each, or run `manage.py prefetch_worker` instead.
+    """
+    global _in_process_scheduler
+    if not settings.PREFETCH_IN_PROCESS:
+        return
+    with _in_process_lock:
+        if _in_process_scheduler is None:
+            _in_process_scheduler = PrefetchScheduler()
+            _in_process_scheduler.start()
@@ -0,0 +1,373 @@
+import logging
+import json
+import hashlib
+import threading
+from datetime import timezone
+from itertools import chain
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.core.cache import caches
+from . import metrics
+from .services.git_service import GitService
+from .services.github_service import GitHubService
+from .services.bitbucket_service import BitbucketService
+from .services.commit_index import CommitIndex
+from .services.repo_cache import normalize_remote_url
+from .models import TrackedRepository
+from .pagination import CommitPage, page_params
+
+logger = logging.getLogger(__name__)
+
+
+def iter_report_commits(data, store=True):
+    """
+    Stream commits for validated request parameters, from the report cache or the matching service
+
+    Args:
+        data: Validated data from CommitRequestSerializer
+        store: Keep the commits to cache the report; streamed responses and
+            stats pass False so that they never hold a whole report in memory
+
+    Yields:
+        CommitRecord objects
+    """
+    metrics.set_provider(data['repo_type'])
+    if settings.REPORT_CACHE_ENABLED:
+        return _iter_cached_commits(data, store)
+    return _iter_service_commits(data)
+
+
+def report_page(data, store=True):
+    """
+    Commits of a report, or only the requested page of them when data has a limit
+
+    Args:
+        data: Validated data from CommitRequestSerializer
+        store: As for iter_report_commits
+
+    Returns:
+        Iterable of CommitRecord objects; when paging, a CommitPage whose
+        next_cursor is set once it has been iterated
+    """
+    if not data.get('limit'):
+        return iter_report_commits(data, store)
+    return CommitPage(iter_report_commits(page_params(data), store), data['limit'], data.get('cursor'))
+
+
+def page_fields(commits):
+    """
+    Response fields describing the page returned by report_page
+    """
+    if isinstance(commits, CommitPage):
+        return {"next_cursor": commits.next_cursor}
+    return {}
+
+
+def _iter_cached_commits(data, store=True):
+    # Results are keyed by the branch tip as well as the parameters, so a cached
+    # report is reused exactly until the branch moves
+    try:
+        tip = report_tip(data)
+    except ValueError as e:
+        logger.info("Report cache bypassed: %s", e)
+        yield from _iter_service_commits(data)
+        return
+
+    cache = caches['reports']
+    key = f"report:{report_key(data)}:{tip}"
+    commits = cache.get(key)
+    if commits is not None:
+        metrics.count('cache_hits', cache='report')
+        yield from commits
+        return
+
+    metrics.count('cache_misses', cache='report')
+    if not store:
+        yield from _iter_service_commits(data, tip)
+        return
+    commits = []
+    for commit in _iter_service_commits(data, tip):
+        if commits is not None:
+            commits.append(commit)
+            if len(commits) > settings.REPORT_CACHE_MAX_COMMITS:
+                # Too large to keep; still stream the rest
+                commits = None
+        yield commit
+    # Only complete reports are stored; a stream abandoned early never gets here
+    if commits is not None:
+        cache.set(key, commits)
+
+
+def report_tip(data):
+    """
+    Get the current commit of the report's branch with one cheap lookup
+
+    Uses rev-parse or `git ls-remote` for git repositories and a single
+    branch/ref API request for GitHub and Bitbucket. For all-branches reports
+    every branch tip is listed and the result is a digest of all of them.
+
+    Args:
+        data: Validated data from CommitRequestSerializer
+
+    Returns:
+        Commit SHA string
+
+    Raises:
+        ValueError: If the branch can't be looked up
+    """
+    repo_path = data['repo_path']
+    repo_type = data['repo_type']
+    branch = data.get('branch', 'main')
+
+    if data.get('all_branches'):
+        tips = report_branch_tips(data)
+        listing = '\n'.join(f"{name} {sha}" for name, sha in sorted(tips.items()))
+        return hashlib.sha1(listing.encode('utf-8')).hexdigest()
+
+    if repo_type == 'local':
+        return GitService().get_branch_tip(repo_path, branch)
+    elif repo_type == 'github':
+        return GitHubService().get_branch_tip(repo_path, branch, auth_token=data.get('auth_token'))
+    elif repo_type == 'bitbucket':
+        return BitbucketService().get_branch_tip(
+            repo_path,
+            branch,
+            auth_username=data.get('auth_username'),
+            auth_token=data.get('auth_token')
+        )
+    raise ValueError(f"Unsupported repository type: {repo_type}")
+
+
+def report_branch_tips(data):
+    """
+    Get the tip of every branch of the report's repository
+
+    Returns:
+        Dict of branch name -> commit SHA
+    """
+    repo_path = data['repo_path']
+    repo_type = data['repo_type']
+
+    if repo_type == 'local':
+        return GitService().list_branch_tips(repo_path)
+    elif repo_type == 'github':
+        return GitHubService().list_branch_tips(repo_path, auth_token=data.get('auth_token'))
+    elif repo_type == 'bitbucket':
+        return BitbucketService().list_branch_tips(
+            repo_path,
+            auth_username=data.get('auth_username'),
+            auth_token=data.get('auth_token')
+        )
+    raise ValueError(f"Unsupported repository type: {repo_type}")
+
+
+def _iter_service_commits(data, tip=None):
+    # A generator, so that nothing (the index lookup included) runs until the
+    # first commit is asked for, on a worker thread for async views
+    repo_path = data['repo_path']
+    repo_type = data['repo_type']
+    filters = {
+        'branch': data.get('branch', 'main'),
+        'username': data.get('username'),
+        'email': data.get('email'),
+        'start_date': data.get('start_date'),
+        'end_date': data.get('end_date'),
+        'all_branches': data.get('all_branches', False),
+        'paths': data.get('paths') or None,
+    }
+
+    indexed = webhook_branch(data, tip)
+    if indexed is not None:
+        # Kept current by push webhooks; no fetch or further API call needed
+        filters.pop('branch')
+        filters.pop('all_branches')
+        yield from CommitIndex().iter_branch(indexed, **filters)
+    elif repo_type == 'local' and settings.COMMIT_INDEX_ENABLED and not filters['all_branches']:
+        # Answer from the persistent commit index, ingesting only new commits
+        filters.pop('all_branches')
+        yield from CommitIndex().iter_commits(repo_path=repo_path, **filters)
+    elif repo_type == 'local':
+        # Use GitService for local repositories
+        yield from GitService().iter_commits(repo_path=repo_path, **filters)
+    elif repo_type == 'github':
+        # Use GitHubService for GitHub repositories
+        yield from GitHubService().iter_commits(
+            repo_path=repo_path,
+            auth_token=data.get('auth_token'),
+            **filters
+        )
+    elif repo_type == 'bitbucket':
+        # Use BitbucketService for Bitbucket repositories
+        yield from BitbucketService().iter_commits(
+            repo_path=repo_path,
+            auth_username=data.get('auth_username'),
+            auth_token=data.get('auth_token'),
+            **filters
+        )
+    else:
+        raise ValueError(f"Unsupported repository type: {repo_type}")
+
+
+def webhook_branch(data, tip=None):
+    """
+    Get the commit index branch that push webhooks keep current for a Bitbucket report
+
+    Only Bitbucket reports read through git (BITBUCKET_GIT_FIRST) are answered
+    from it, as the index holds the same git author names and commit dates;
+    GitHub reports carry account logins and author dates from the API, which
+    git does not have. The branch is only used if the provider, asked with the
+    caller's credentials, reports the same tip: that checks the caller may read
+    the repository, and that no push was missed since the last delivery.
+
+    Args:
+        data: Validated data from CommitRequestSerializer
+        tip: The branch's current commit, if already looked up with the caller's credentials
+
+    Returns:
+        Branch model instance, or None if the report goes to the provider
+    """
+    if data['repo_type'] != 'bitbucket' or data.get('all_branches'):
+        return None
+    if not (settings.COMMIT_INDEX_ENABLED and settings.WEBHOOK_REPORTS_FROM_INDEX and settings.BITBUCKET_GIT_FIRST):
+        return None
+    tracked = TrackedRepository.objects.filter(
+        repo_type='bitbucket',
+        key=normalize_repository('bitbucket', data['repo_path'])
+    ).exclude(webhook_url='').first()
+    if tracked is None:
+        return None
+    branch = data.get('branch', 'main')
+    indexed = CommitIndex().get_branch(tracked.webhook_url, branch)
+    if indexed is None:
+        return None
+
+    if tip is None:
+        try:
+            tip = BitbucketService().get_branch_tip(
+                data['repo_path'],
+                branch,
+                auth_username=data.get('auth_username'),
+                auth_token=data.get('auth_token')
+            )
+        except ValueError as e:
+            # Left to the provider path, which reports its own error
+            logger.info("Commit index bypassed: %s", e)
+            return None
+    if tip != indexed.tip:
+        logger.info("Commit index bypassed: %s is at %s, the index at %s", branch, tip, indexed.tip)
+        return None
+    return indexed
+
+
+def prime(commits):
+    """
+    Run a commit generator up to its first commit
+
+    Clone, authentication and branch errors surface here, while the response
+    status can still be chosen, instead of in the middle of a stream.
+
+    Returns:
+        Iterator over all commits, including the first one
+    """
+    commits = iter(commits)
+    for first in commits:
+        return chain([first], commits)
+    return iter([])
+
+
+def report_summary(data):
+    """
+    Repository, branch and filters of a report, as echoed back in responses
+    """
+    return {
+        "repository": data['repo_path'],
+        "branch": data.get('branch', 'main'),
+        "filters": report_filters(data)
+    }
+
+
+def report_filters(data):
+    """
+    Author and date filters of a report, as echoed back in responses
+    """
+    return {
+        "username": data.get('username'),
+        "email": data.get('email'),
+        "start_date": data.get('start_date'),
+        "end_date": data.get('end_date'),
+        "paths": data.get('paths')
+    }
+
+
+def normalize_repository(repo_type, repo_path):
+    """
+    Normalize a repository reference so that equivalent spellings compare equal
+
+    'https://github.com/Org/Repo.git' and 'org/repo' name the same GitHub
+    repository; local paths are made absolute.
+    """
+    repo_path = repo_path.strip()
+    if repo_type == 'local':
+        return normalize_remote_url(repo_path)
+    if '://' in repo_path or '@' in repo_path:
+        # Drop the host, the API services only use owner/repo (workspace/slug)
+        repo_path = normalize_remote_url(repo_path).split('/', 1)[-1]
+    repo_path = repo_path.strip('/')
+    if repo_path.endswith('.git'):
+        repo_path = repo_path[:-4]
+    # GitHub and Bitbucket repository names are case-insensitive
+    return repo_path.lower()
+
+
+def report_key(data):
+    """
+    Key identifying a report: two requests with the same key return the same commits
+
+    Covers the normalized repository, branch and filters, plus a hash of the
+    credentials, since different tokens may see different repositories.
+
+    Args:
+        data: Validated data from CommitRequestSerializer
+
+    Returns:
+        Hex digest string
+    """
+    def iso(value):
+        return value.astimezone(timezone.utc).isoformat() if value else None
+
+    credentials = f"{data.get('auth_username') or ''}:{data.get('auth_token') or ''}"
+    parts = {
+        'repo_type': data['repo_type'],
+        'repository': normalize_repository(data['repo_type'], data['repo_path']),
+        'branch': data.get('branch') or 'main',
+        'username': data.get('username') or None,
+        'email': data.get('email') or None,
+        'start_date': iso(data.get('start_date')),
+        'end_date': iso(data.get('end_date')),
+        'all_branches': bool(data.get('all_branches')),
+        'paths': sorted(data.get('paths') or []),
+        'credentials': hashlib.sha256(credentials.encode('utf-8')).hexdigest(),
+    }
+    return hashlib.sha256(json.dumps(parts, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+_report_executor = None
+_report_executor_lock = threading.Lock()
+
+
+def get_report_executor():
+    """
+    Get the process-wide thread pool that runs blocking report work for async views
+
+    Its size (settings.ASYNC_REPORT_WORKERS) bounds how many reports do git or
+    provider I/O at once; further requests wait on the event loop without
+    holding a thread.
+    """
+    global _report_executor
+    with _report_executor_lock:
+        if _report_executor is None:
+            _report_executor = ThreadPoolExecutor(
+                max_workers=settings.ASYNC_REPORT_WORKERS,
+                thread_name_prefix='report'
+            )
+    return _report_executor
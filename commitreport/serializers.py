@@ -1,5 +1,25 @@
 from rest_framework import serializers
 from datetime import datetime
+from .pagination import decode_cursor
+
+
+def normalize_paths(paths):
+    """
+    Turn requested paths into repository-relative paths without leading or trailing slashes
+
+    Raises:
+        serializers.ValidationError: For empty paths or paths leaving the repository
+    """
+    normalized = []
+    for requested in paths:
+        path = requested.strip().strip('/')
+        while path.startswith('./'):
+            path = path[2:].lstrip('/')
+        if not path or any(part in ('', '.', '..') for part in path.split('/')):
+            raise serializers.ValidationError(f"Invalid path: '{requested}'")
+        if path not in normalized:
+            normalized.append(path)
+    return normalized
 
 class CommitRequestSerializer(serializers.Serializer):
     """
@@ -36,6 +56,17 @@ class CommitRequestSerializer(serializers.Serializer):
         default='main',
         help_text="Branch to fetch commits from"
     )
+    all_branches = serializers.BooleanField(
+        required=False,
+        default=False,
+        help_text="Fetch commits from all branches instead of one; each commit is listed once with the branches containing it"
+    )
+    paths = serializers.ListField(
+        child=serializers.CharField(),
+        required=False,
+        allow_empty=False,
+        help_text="Only commits changing a file at or under one of these repository paths"
+    )
     # For remote repositories authentication
     auth_token = serializers.CharField(
         required=False,
@@ -47,10 +78,150 @@ class CommitRequestSerializer(serializers.Serializer):
         allow_blank=True,
         help_text="Authentication username for Bitbucket"
     )
+    format = serializers.ChoiceField(
+        choices=['json', 'ndjson'],
+        default='json',
+        help_text="Response format; 'ndjson' streams one commit per line followed by a summary line"
+    )
+    limit = serializers.IntegerField(
+        required=False,
+        min_value=1,
+        max_value=1000,
+        help_text="Return at most this many commits, plus a next_cursor for the following page"
+    )
+    cursor = serializers.CharField(
+        required=False,
+        help_text="next_cursor of the previous page"
+    )
+
+    def validate_paths(self, value):
+        return normalize_paths(value)
+
+    def validate_cursor(self, value):
+        try:
+            return decode_cursor(value)
+        except ValueError as e:
+            raise serializers.ValidationError(str(e))
+
+class BatchRepositorySerializer(serializers.Serializer):
+    """
+    Serializer for one repository of a batch request
+    """
+    repo_path = serializers.CharField(
+        help_text="Path to repository (local path or remote URL)"
+    )
+    repo_type = serializers.ChoiceField(
+        choices=['local', 'github', 'bitbucket'],
+        default='github',
+        help_text="Type of repository"
+    )
+    branch = serializers.CharField(
+        required=False,
+        help_text="Branch to fetch commits from, overriding the batch branch"
+    )
+    auth_token = serializers.CharField(
+        required=False,
+        allow_blank=True,
+        help_text="Authentication token for GitHub/Bitbucket, overriding the batch token"
+    )
+    auth_username = serializers.CharField(
+        required=False,
+        allow_blank=True,
+        help_text="Authentication username for Bitbucket, overriding the batch username"
+    )
+
+class BatchCommitRequestSerializer(serializers.Serializer):
+    """
+    Serializer for request parameters to fetch git commits from several repositories
+    """
+    repositories = serializers.ListField(
+        child=BatchRepositorySerializer(),
+        min_length=1,
+        help_text="Repositories to report on"
+    )
+    username = serializers.CharField(
+        required=False,
+        allow_blank=True,
+        help_text="Filter commits by username"
+    )
+    email = serializers.EmailField(
+        required=False,
+        allow_blank=True,
+        help_text="Filter commits by email"
+    )
+    start_date = serializers.DateTimeField(
+        required=False,
+        help_text="Filter commits from this date (ISO format)"
+    )
+    end_date = serializers.DateTimeField(
+        required=False,
+        help_text="Filter commits until this date (ISO format)"
+    )
+    branch = serializers.CharField(
+        required=False,
+        default='main',
+        help_text="Branch to fetch commits from, unless set per repository"
+    )
+    all_branches = serializers.BooleanField(
+        required=False,
+        default=False,
+        help_text="Fetch commits from all branches of every repository"
+    )
+    paths = serializers.ListField(
+        child=serializers.CharField(),
+        required=False,
+        allow_empty=False,
+        help_text="Only commits changing a file at or under one of these paths, in every repository"
+    )
+    auth_token = serializers.CharField(
+        required=False,
+        allow_blank=True,
+        help_text="Authentication token for GitHub/Bitbucket, unless set per repository"
+    )
+    auth_username = serializers.CharField(
+        required=False,
+        allow_blank=True,
+        help_text="Authentication username for Bitbucket, unless set per repository"
+    )
+    format = serializers.ChoiceField(
+        choices=['json', 'ndjson'],
+        default='json',
+        help_text="Response format; 'ndjson' streams one line per repository as it finishes, followed by a summary line"
+    )
+
+    def validate_paths(self, value):
+        return normalize_paths(value)
+
+class TrackedRepositorySerializer(serializers.Serializer):
+    """
+    Serializer for registering a repository with the prefetch scheduler
+    """
+    repo_path = serializers.CharField(
+        help_text="Path to repository (local path or remote URL); credentials in URLs are dropped"
+    )
+    repo_type = serializers.ChoiceField(
+        choices=['local', 'github', 'bitbucket'],
+        default='github',
+        help_text="Type of repository"
+    )
+    branches = serializers.ListField(
+        child=serializers.CharField(),
+        default=['main'],
+        allow_empty=False,
+        help_text="Branches to keep fresh"
+    )
+    refresh_interval = serializers.IntegerField(
+        required=False,
+        min_value=1,
+        help_text="Seconds between refreshes (at least PREFETCH_MIN_INTERVAL)"
+    )
 
 class CommitSerializer(serializers.Serializer):
     """
     Serializer for git commit data
+
+    Defines the commit output format. Responses are encoded with
+    encoders.CommitEncoder, which must produce the same output.
     """
     commit_hash = serializers.CharField()
     author_name = serializers.CharField()
@@ -60,4 +231,9 @@ class CommitSerializer(serializers.Serializer):
     files_changed = serializers.ListField(
         child=serializers.CharField(),
         required=False
+    )
+    # Only set for all-branches reports
+    branches = serializers.ListField(
+        child=serializers.CharField(),
+        required=False
     )
\ No newline at end of file
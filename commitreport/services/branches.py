@@ -0,0 +1,116 @@
+from itertools import repeat
+
+
+class BranchTracker:
+    """
+    Work out which branches contain each commit during one walk over all branches
+
+    Commits must be visited in topological order (every commit before its
+    parents), as `git log --date-order` lists them. A commit's branch set is then
+    complete when it is visited, and is handed down to its parents, so the cost
+    is proportional to the number of unique commits, not branches times history.
+    """
+
+    def __init__(self, tips):
+        """
+        Args:
+            tips: Dict of branch name -> tip commit sha
+        """
+        self._pending = {}
+        # Most commits share one of a few branch sets; keep one copy of each,
+        # and of its sorted form
+        self._interned = {}
+        self._sorted = {}
+        for name, sha in tips.items():
+            self._pending[sha] = self._intern(self._pending.get(sha, frozenset()) | {name})
+
+    def _intern(self, branches):
+        return self._interned.setdefault(branches, branches)
+
+    def visit(self, sha, parents):
+        """
+        Get the branches containing a commit and pass them on to its parents
+
+        Args:
+            sha: Commit sha
+            parents: Parent commit shas
+
+        Returns:
+            Sorted tuple of branch names
+        """
+        branches = self._pending.pop(sha, frozenset())
+        for parent in parents:
+            inherited = self._pending.get(parent)
+            if inherited is None:
+                self._pending[parent] = branches
+            elif not branches <= inherited:
+                self._pending[parent] = self._intern(inherited | branches)
+        names = self._sorted.get(branches)
+        if names is None:
+            names = self._sorted[branches] = tuple(sorted(branches))
+        return names
+
+
+def topo_order(parents):
+    """
+    Order the commits of a graph so that every commit comes before its parents
+
+    Args:
+        parents: Dict of commit sha -> parent shas; parents missing from the dict are ignored
+
+    Returns:
+        List of commit shas
+    """
+    children_left = dict.fromkeys(parents, 0)
+    for sha, commit_parents in parents.items():
+        for parent in commit_parents:
+            if parent in children_left:
+                children_left[parent] += 1
+
+    ready = [sha for sha, count in children_left.items() if count == 0]
+    order = []
+    while ready:
+        sha = ready.pop()
+        order.append(sha)
+        for parent in parents[sha]:
+            if parent in children_left:
+                children_left[parent] -= 1
+                if children_left[parent] == 0:
+                    ready.append(parent)
+    return order
+
+
+def collect_branch_graph(listings, heads=None):
+    """
+    Read per-branch commit listings into one graph, reading as little as possible
+
+    A listing is read until every commit it still has to reach is already in
+    the graph: the ancestry of a known commit was read with an earlier branch,
+    so shared history is fetched once instead of once per branch.
+
+    Args:
+        listings: Iterable of iterables, one per branch, of (sha, parent_shas, item)
+        heads: Iterable of the tip shas each listing starts from, in the same
+            order. Needed when a listing covers several branches, so it is read
+            until all of them are reached; a listing whose tips are all known
+            is not read at all.
+
+    Returns:
+        Dict of commit sha -> (parent_shas, item)
+    """
+    known = {}
+    for listing, tips in zip(listings, heads if heads is not None else repeat(None)):
+        # Commits reachable from this listing that haven't been read yet
+        frontier = set()
+        if tips is not None:
+            frontier.update(sha for sha in tips if sha not in known)
+            if not frontier:
+                continue
+        for sha, commit_parents, item in listing:
+            frontier.discard(sha)
+            if sha not in known:
+                known[sha] = (commit_parents, item)
+                frontier.update(parent for parent in commit_parents if parent not in known)
+            if not frontier:
+                break
+    return known
@@ -0,0 +1,290 @@
+import git
+from django.db import transaction
+from django.db.models import Prefetch, Q, Exists, OuterRef
+from django.db.models.functions import Lower
+from django.utils import timezone
+from .. import metrics
+from ..models import Repository, Branch, Commit, FileChange
+from .git_log import iter_git_log
+from .git_service import GitService
+from .repo_cache import normalize_remote_url
+from .records import CommitRecord
+
+INGEST_BATCH_SIZE = 1000
+
+
+class CommitIndex:
+    """
+    Persistent, indexed store of commits backed by the Django database
+
+    Each branch remembers the last tip that was ingested, so only commits that
+    are new since then are read from git. Reports are then answered by indexed
+    range scans instead of walking the branch history.
+    """
+
+    def __init__(self):
+        self.git_service = GitService()
+
+    def ingest(self, repo_path, branch='main', targeted=False):
+        """
+        Bring the index up to date with a branch of a repository
+
+        Args:
+            repo_path: Path to the repository (local or remote URL)
+            branch: Branch to ingest
+            targeted: Only fetch this branch into the repository's mirror
+
+        Returns:
+            Branch model instance for the ingested branch
+        """
+        # The index keeps full history, so never restrict the mirror to a shallow window
+        with self.git_service.open_repo(repo_path, branch=branch if targeted else None) as repo:
+            branch = self.git_service.resolve_branch(repo, branch)
+            try:
+                tip = repo.rev_parse(branch).hexsha
+            except (git.BadName, ValueError) as e:
+                raise ValueError(f"Failed to resolve branch '{branch}': {str(e)}")
+
+            repository, _ = Repository.objects.get_or_create(url=normalize_remote_url(repo_path))
+            branch_row, _ = Branch.objects.get_or_create(repository=repository, name=branch)
+            if branch_row.tip == tip:
+                metrics.count('cache_hits', cache='index')
+                return branch_row
+            metrics.count('cache_misses', cache='index')
+
+            options = []
+            previous_tip = branch_row.tip
+            fast_forward = bool(previous_tip) and self._is_ancestor(repo, previous_tip, tip)
+            if fast_forward:
+                # Only the commits that are new since the last ingested tip
+                options.append(f"^{previous_tip}")
+
+            # Commits are written in short transactions of INGEST_BATCH_SIZE, so a long
+            # first ingestion never holds the database's write lock for its whole run.
+            # They only become part of the branch in the final, quick membership update
+            commit_ids = []
+            try:
+                with metrics.phase('ingest', 'index'):
+                    batch = []
+                    for commit in iter_git_log(repo.git_dir, tip, options):
+                        batch.append(commit)
+                        if len(batch) >= INGEST_BATCH_SIZE:
+                            commit_ids.extend(self._store_commits(repository, batch))
+                            batch = []
+                    if batch:
+                        commit_ids.extend(self._store_commits(repository, batch))
+
+                    with transaction.atomic():
+                        # Only if no concurrent ingestion or push moved the branch meanwhile
+                        moved = Branch.objects.filter(pk=branch_row.pk, tip=previous_tip).update(
+                            tip=tip,
+                            ingested_at=timezone.now()
+                        )
+                        if moved:
+                            if not fast_forward:
+                                # First ingestion or rewritten history: rebuild the branch's membership
+                                branch_row.commits.clear()
+                            self._add_to_branch(branch_row, commit_ids)
+            except git.GitCommandError as e:
+                raise ValueError(f"Failed to ingest commits: {str(e)}")
+
+        branch_row.refresh_from_db()
+        return branch_row
+
+    def push(self, repo_path, branch, before, after, commits):
+        """
+        Apply a push to a branch from the commits it added, without reading git
+
+        Only applies when the branch was ingested up to before, so that commits
+        lists exactly the commits the branch gained.
+
+        Args:
+            repo_path: Path to the repository (local or remote URL)
+            branch: Pushed branch
+            before: Commit the branch pointed to before the push
+            after: Commit it points to now
+            commits: CommitRecord objects of the commits added, newest first,
+                or None if they are not known
+
+        Returns:
+            Number of commits stored (0 if the branch was already at after), or
+            None if the branch has to be ingested from git instead (see ingest
+            with targeted=True)
+        """
+        repository, _ = Repository.objects.get_or_create(url=normalize_remote_url(repo_path))
+        branch_row, _ = Branch.objects.get_or_create(repository=repository, name=branch)
+        if branch_row.tip == after:
+            # A redelivery, or a fetch already picked the push up
+            metrics.count('cache_hits', cache='index')
+            return 0
+        metrics.count('cache_misses', cache='index')
+        if commits is None or not branch_row.tip or branch_row.tip != before:
+            return None
+
+        with metrics.phase('ingest', 'index'), transaction.atomic():
+            # Only move the branch if no other push or ingestion moved it since it was read
+            moved = Branch.objects.filter(pk=branch_row.pk, tip=before).update(tip=after, ingested_at=timezone.now())
+            if not moved:
+                return None
+            for start in range(0, len(commits), INGEST_BATCH_SIZE):
+                self._store_batch(repository, branch_row, commits[start:start + INGEST_BATCH_SIZE])
+        return len(commits)
+
+    def delete_branch(self, repo_path, branch):
+        """
+        Forget a branch that was deleted; its commits stay indexed for other branches
+        """
+        Branch.objects.filter(repository__url=normalize_remote_url(repo_path), name=branch).delete()
+
+    def get_branch(self, repo_path, branch='main'):
+        """
+        Get the indexed branch of a repository as last ingested, without reading git
+
+        Returns:
+            Branch model instance, or None if the branch was never ingested
+        """
+        return Branch.objects.filter(
+            repository__url=normalize_remote_url(repo_path),
+            name=branch
+        ).exclude(tip='').first()
+
+    def _is_ancestor(self, repo, ancestor, descendant):
+        try:
+            repo.git.merge_base('--is-ancestor', ancestor, descendant)
+            return True
+        except git.GitCommandError:
+            return False
+
+    def _store_batch(self, repository, branch_row, batch):
+        self._add_to_branch(branch_row, self._store_commits(repository, batch))
+
+    def _store_commits(self, repository, batch):
+        """
+        Store the commits of a batch that are not indexed yet, with their changed paths
+
+        Returns:
+            Ids of every commit of the batch, in batch order
+        """
+        hashes = [commit.commit_hash for commit in batch]
+        with transaction.atomic():
+            existing = set(
+                Commit.objects.filter(repository=repository, commit_hash__in=hashes)
+                .values_list('commit_hash', flat=True)
+            )
+
+            new_commits = [commit for commit in batch if commit.commit_hash not in existing]
+            # ignore_conflicts keeps concurrent ingestion of a shared commit from failing
+            Commit.objects.bulk_create([
+                Commit(
+                    repository=repository,
+                    commit_hash=commit.commit_hash,
+                    author_name=commit.author_name,
+                    author_email=commit.author_email,
+                    date=commit.date,
+                    message=commit.message,
+                )
+                for commit in new_commits
+            ], ignore_conflicts=True)
+
+            ids = dict(
+                Commit.objects.filter(repository=repository, commit_hash__in=hashes)
+                .values_list('commit_hash', 'id')
+            )
+            FileChange.objects.bulk_create([
+                FileChange(commit_id=ids[commit.commit_hash], path=path)
+                for commit in new_commits
+                for path in commit.files_changed
+            ])
+        return [ids[commit_hash] for commit_hash in hashes]
+
+    def _add_to_branch(self, branch_row, commit_ids):
+        Membership = Commit.branches.through
+        Membership.objects.bulk_create([
+            Membership(commit_id=commit_id, branch_id=branch_row.id)
+            for commit_id in commit_ids
+        ], ignore_conflicts=True)
+
+    def get_commits(self, repo_path, branch='main', username=None, email=None, start_date=None, end_date=None,
+                    paths=None):
+        """
+        Get commits of a branch from the index, ingesting new commits first
+
+        Args:
+            repo_path: Path to the repository (local or remote URL)
+            branch: Branch to fetch commits from
+            username: Filter commits by author username
+            email: Filter commits by author email
+            start_date: Filter commits from this date
+            end_date: Filter commits until this date
+            paths: Only commits changing files under these paths
+
+        Returns:
+            List of CommitRecord objects
+        """
+        return list(self.iter_commits(repo_path, branch, username, email, start_date, end_date, paths))
+
+    def iter_commits(self, repo_path, branch='main', username=None, email=None, start_date=None, end_date=None,
+                     paths=None):
+        """
+        Stream commits of a branch from the index in chunks, ingesting new commits first
+
+        Takes the same arguments as get_commits.
+
+        Yields:
+            CommitRecord objects
+        """
+        branch_row = self.ingest(repo_path, branch)
+        yield from self.iter_branch(branch_row, username, email, start_date, end_date, paths)
+
+    def iter_branch(self, branch_row, username=None, email=None, start_date=None, end_date=None, paths=None):
+        """
+        Stream commits of an indexed branch as last ingested, without reading git
+
+        Args:
+            branch_row: Branch model instance, from ingest or get_branch
+            username, email, start_date, end_date, paths: Filters as for get_commits
+
+        Yields:
+            CommitRecord objects
+        """
+        queryset = Commit.objects.filter(repository_id=branch_row.repository_id, branches=branch_row)
+        if username:
+            queryset = queryset.filter(author_name__iexact=username)
+        if email:
+            queryset = queryset.alias(author_email_lower=Lower('author_email')).filter(author_email_lower=email.lower())
+        if start_date:
+            queryset = queryset.filter(date__gte=start_date)
+        if end_date:
+            queryset = queryset.filter(date__lte=end_date)
+        if paths:
+            # Same literal prefix match as touches_paths. A range rather than
+            # startswith, which SQLite's LIKE would make case-insensitive;
+            # '0' is the character after '/'
+            matches = Q()
+            for path in paths:
+                directory = path.rstrip('/')
+                matches |= Q(path=directory) | Q(path__gte=directory + '/', path__lt=directory + '0')
+            queryset = queryset.filter(Exists(FileChange.objects.filter(matches, commit=OuterRef('pk'))))
+
+        # Within a batch, ids follow git log order, which breaks ties between equal dates
+        queryset = queryset.order_by('-date', 'id').prefetch_related(
+            Prefetch('file_changes', queryset=FileChange.objects.order_by('id'))
+        )
+
+        # The filters run in the database, so every commit read is returned
+        rows = metrics.timed(queryset.iterator(chunk_size=INGEST_BATCH_SIZE), 'query', 'index',
+                             counter='commits_walked')
+        returned = 0
+        try:
+            for commit in rows:
+                returned += 1
+                yield CommitRecord(
+                    commit.commit_hash,
+                    commit.author_name,
+                    commit.author_email,
+                    commit.date,
+                    commit.message,
+                    [change.path for change in commit.file_changes.all()]
+                )
+        finally:
+            metrics.count('commits_returned', returned, provider='index')
@@ -0,0 +1,68 @@
+import contextvars
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from django.conf import settings
+from .http_cache import make_adapter
+
+
+def imap_ordered(func, items, max_workers=None):
+    """
+    Apply a blocking function to items on a bounded thread pool
+
+    At most max_workers calls run at once and only a small window of results is
+    buffered, so items can come from a lazy iterator (e.g. API pagination).
+    Results are yielded in the order of the input items. Each call runs in a
+    copy of the caller's context, so it records into the same request metrics.
+
+    Args:
+        func: Function to call with each item
+        items: Iterable of items
+        max_workers: Concurrency limit, defaults to settings.PROVIDER_FETCH_CONCURRENCY
+
+    Yields:
+        (item, result) tuples in input order
+    """
+    max_workers = max_workers or settings.PROVIDER_FETCH_CONCURRENCY
+    if max_workers <= 1:
+        for item in items:
+            yield item, func(item)
+        return
+
+    window = max_workers * 2
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending = deque()
+        try:
+            for item in items:
+                pending.append((item, executor.submit(contextvars.copy_context().run, func, item)))
+                if len(pending) >= window:
+                    head, future = pending.popleft()
+                    yield head, future.result()
+            while pending:
+                head, future = pending.popleft()
+                yield head, future.result()
+        finally:
+            # The consumer stopped early or a call failed: drop work not yet started
+            for _, future in pending:
+                future.cancel()
+
+
+def pooled_session(max_connections=None, provider=None):
+    """
+    Create a requests session that keeps up to max_connections connections per host alive
+
+    Responses go through the HTTP response cache when HTTP_CACHE_ENABLED is set.
+
+    Args:
+        max_connections: Pool size, defaults to settings.PROVIDER_FETCH_CONCURRENCY
+        provider: Label the session's API calls are counted under
+
+    Returns:
+        requests.Session
+    """
+    max_connections = max_connections or settings.PROVIDER_FETCH_CONCURRENCY
+    session = requests.Session()
+    adapter = make_adapter(provider=provider, pool_connections=max_connections, pool_maxsize=max_connections)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
@@ -0,0 +1,124 @@
+import subprocess
+import tempfile
+import git
+from datetime import datetime, timezone
+from .records import CommitRecord
+
+# Every record starts with an empty field (a path or header field is never empty
+# at that position), followed by hash, parents, author name, author email,
+# committer timestamp and raw message. With -z, the changed paths that follow
+# are NUL-terminated as well.
+LOG_FORMAT = '%x00%H%x00%P%x00%an%x00%ae%x00%ct%x00%B'
+HEADER_FIELDS = 6
+
+READ_SIZE = 64 * 1024
+
+
+def iter_git_log(git_dir, revision, options=None, with_parents=False, paths=None):
+    """
+    Stream commits from a single `git log` subprocess
+
+    Changed paths come from --name-only in the same process instead of one diff
+    per commit. Merge commits list the paths changed against their first parent
+    and root commits list no paths, as the per-commit parent diffs did before.
+
+    With paths, git skips commits that change nothing under them; a commit-graph
+    with changed-path Bloom filters lets it do so without diffing most of them.
+    Every commit on the branch is still considered (--full-history), and the
+    commits listed keep their full list of changed files. Merges may be listed
+    for changes coming from their other parents, so callers compare
+    files_changed with the paths themselves.
+
+    Args:
+        git_dir: Path to the repository's git directory
+        revision: Revision to walk from (branch, ref or sha), or a list of them
+        options: Additional rev-walk options, e.g. ['--since=@1700000000']
+        with_parents: Yield (commit, parent_shas) tuples instead of commits
+        paths: Only list commits changing files under these literal paths
+
+    Yields:
+        CommitRecord objects
+    """
+    command = ['git', '--git-dir', git_dir]
+    if paths:
+        # Paths are prefixes, never globs or pathspec magic
+        command.append('--literal-pathspecs')
+    command.extend([
+        # Root commits are reported without files, skip computing their diff
+        '-c', 'log.showRoot=false',
+        'log', '-z', f'--format={LOG_FORMAT}', '--name-only', '--no-renames',
+        '--diff-merges=first-parent',
+    ])
+    if paths:
+        command.extend(['--full-history', '--full-diff'])
+    command.extend(options or [])
+    command.extend([revision] if isinstance(revision, str) else revision)
+    command.append('--')
+    command.extend(paths or [])
+
+    with tempfile.TemporaryFile() as stderr:
+        process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=stderr)
+        try:
+            yield from _parse_records(_iter_fields(process.stdout), with_parents)
+            status = process.wait()
+            if status != 0:
+                stderr.seek(0)
+                raise git.GitCommandError(command, status, stderr.read())
+        finally:
+            # The caller may stop iterating early; do not leave git running
+            if process.poll() is None:
+                process.kill()
+                process.wait()
+            process.stdout.close()
+
+
+def _iter_fields(stream):
+    pending = b''
+    while True:
+        chunk = stream.read(READ_SIZE)
+        if not chunk:
+            break
+        fields = (pending + chunk).split(b'\0')
+        pending = fields.pop()
+        for field in fields:
+            yield field.decode('utf-8', errors='replace')
+    if pending:
+        yield pending.decode('utf-8', errors='replace')
+
+
+def _parse_records(fields, with_parents=False):
+    header = None
+    files_changed = []
+    for field in fields:
+        if field == '' and (header is None or len(header) == HEADER_FIELDS):
+            if header is not None:
+                yield _make_commit(header, files_changed, with_parents)
+            header = []
+            files_changed = []
+        elif header is None:
+            continue
+        elif len(header) < HEADER_FIELDS:
+            header.append(field)
+        else:
+            # The path list is separated from the message by a newline
+            files_changed.append(field.lstrip('\n') if not files_changed else field)
+
+    if header is not None and len(header) == HEADER_FIELDS:
+        yield _make_commit(header, files_changed, with_parents)
+
+
+def _make_commit(header, files_changed, with_parents=False):
+    commit_hash, parents, author_name, author_email, timestamp, message = header
+    if not parents:
+        files_changed = []
+    commit = CommitRecord(
+        commit_hash,
+        author_name,
+        author_email,
+        datetime.fromtimestamp(int(timestamp), tz=timezone.utc),
+        message,
+        [path for path in files_changed if path]
+    )
+    if with_parents:
+        return commit, parents.split()
+    return commit
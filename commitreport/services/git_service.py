@@ -1,9 +1,11 @@
 import os
-import shutil
 import git
-import tempfile
-from datetime import datetime
-from django.conf import settings
+from contextlib import contextmanager
+from .. import metrics
+from .git_log import iter_git_log
+from .records import touches_paths
+from .branches import BranchTracker
+from .repo_cache import RepoCache, redact_credentials, strip_credentials
 
 class GitService:
     """
@@ -11,25 +13,141 @@ class GitService:
     """
     
     def __init__(self):
-        self.temp_dir = settings.GIT_TEMP_CLONE_DIR
+        self.repo_cache = RepoCache()
     
-    def _get_repo(self, repo_path):
+    def get_repo(self, repo_path, start_date=None, branch=None):
         """
-        Get a git repository object either from a local path or by cloning a remote URL
+        Get a git repository object either from a local path or from the mirror cache for a remote URL
+
+        With branch, an existing mirror only fetches that branch.
         """
         if os.path.isdir(repo_path) and os.path.isdir(os.path.join(repo_path, '.git')):
             # Local repository
             return git.Repo(repo_path)
         else:
-            # Remote repository needs to be cloned
-            temp_dir = tempfile.mkdtemp(dir=self.temp_dir)
-            try:
-                return git.Repo.clone_from(repo_path, temp_dir)
-            except git.GitCommandError as e:
-                shutil.rmtree(temp_dir, ignore_errors=True)
-                raise ValueError(f"Failed to clone repository: {str(e)}")
+            # Remote repository is cloned once and fetched on later requests
+            return self.repo_cache.get_repo(repo_path, start_date=start_date, branch=branch)
+    
+    @contextmanager
+    def open_repo(self, repo_path, start_date=None, branch=None, paths=None):
+        """
+        Get a git repository object like get_repo, for reading until the block exits
+
+        A remote's mirror is kept from eviction meanwhile. paths are the paths
+        the caller's walk is limited to, if any.
+        """
+        if os.path.isdir(repo_path) and os.path.isdir(os.path.join(repo_path, '.git')):
+            yield git.Repo(repo_path)
+        else:
+            with self.repo_cache.open_repo(repo_path, start_date=start_date, branch=branch, paths=paths) as repo:
+                yield repo
+    
+    def resolve_branch(self, repo, branch):
+        """
+        Get the name to walk for a requested branch, falling back to the default branch
+        """
+        with metrics.phase('ref', 'git'):
+            # Check if the specified branch exists
+            if branch not in [ref.name.split('/')[-1] for ref in repo.references]:
+                # Try with origin/branch_name
+                origin_branch = f"origin/{branch}"
+                if origin_branch not in [ref.name for ref in repo.references]:
+                    # If branch doesn't exist, use the default branch
+                    branch = repo.active_branch.name
+        return branch
+    
+    def get_branch_tip(self, repo_path, branch='main'):
+        """
+        Get the commit a branch currently points to, without cloning or fetching
+        
+        Local repositories are read directly. Remote ones are asked with a single
+        `git ls-remote`, and a branch that does not exist there resolves to the
+        remote HEAD, like the default branch fallback of resolve_branch.
+        
+        Args:
+            repo_path: Path to the repository (local or remote URL)
+            branch: Branch name
+            
+        Returns:
+            Commit SHA string
+        """
+        try:
+            if os.path.isdir(repo_path) and os.path.isdir(os.path.join(repo_path, '.git')):
+                repo = git.Repo(repo_path)
+                return repo.git.rev_parse(self.resolve_branch(repo, branch))
+            
+            with metrics.phase('ref', 'git'):
+                output = git.Git().ls_remote(repo_path, 'HEAD', branch)
+        except git.GitCommandError as e:
+            raise ValueError(f"Failed to read branch tip: {redact_credentials(str(e), repo_path)}")
+        
+        refs = {}
+        for line in output.splitlines():
+            sha, _, ref = line.partition('\t')
+            refs[ref] = sha
+        # Same precedence as git uses when log resolves the bare name
+        for ref in [f"refs/tags/{branch}", f"refs/heads/{branch}", 'HEAD']:
+            if ref in refs:
+                return refs[ref]
+        raise ValueError(f"Branch {branch} not found in {strip_credentials(repo_path)}")
+    
+    def list_branch_tips(self, repo_path):
+        """
+        Get the commit every branch currently points to, without cloning or fetching
+        
+        Args:
+            repo_path: Path to the repository (local or remote URL)
+            
+        Returns:
+            Dict of branch name -> commit SHA
+        """
+        try:
+            if os.path.isdir(repo_path) and os.path.isdir(os.path.join(repo_path, '.git')):
+                return self._branch_tips(git.Repo(repo_path))
+            
+            output = git.Git().ls_remote('--heads', repo_path)
+        except git.GitCommandError as e:
+            raise ValueError(f"Failed to read branch tips: {redact_credentials(str(e), repo_path)}")
+        
+        tips = {}
+        for line in output.splitlines():
+            sha, _, ref = line.partition('\t')
+            tips[ref[len('refs/heads/'):]] = sha
+        return tips
     
-    def get_commits(self, repo_path, branch='main', username=None, email=None, start_date=None, end_date=None):
+    def _branch_tips(self, repo):
+        # Local and remote-tracking branches; mirrors only have local ones
+        output = repo.git.for_each_ref('--format=%(objectname) %(refname)', 'refs/heads', 'refs/remotes')
+        tips = {}
+        for line in output.splitlines():
+            sha, _, ref = line.partition(' ')
+            if ref.endswith('/HEAD'):
+                continue
+            for prefix in ('refs/heads/', 'refs/remotes/'):
+                if ref.startswith(prefix):
+                    tips[ref[len(prefix):]] = sha
+        return tips
+    
+    def _rev_walk_options(self, username=None, email=None, start_date=None, end_date=None):
+        """
+        Translate the report filters into git rev-walk options, so git prunes the walk
+        itself instead of handing every commit of the branch to Python
+        
+        --author is a case-insensitive substring match here (and git ORs repeated
+        --author options), so the exact comparisons in get_commits still apply.
+        """
+        options = []
+        author = email or username
+        if author:
+            options.extend([f"--author={author}", '--fixed-strings', '--regexp-ignore-case'])
+        if start_date:
+            options.append(f"--since=@{int(start_date.timestamp())}")
+        if end_date:
+            options.append(f"--until=@{int(end_date.timestamp())}")
+        return options
+    
+    def get_commits(self, repo_path, branch='main', username=None, email=None, start_date=None, end_date=None,
+                    all_branches=False, paths=None):
         """
         Get commits from a git repository
         
@@ -40,65 +158,107 @@ class GitService:
             email: Filter commits by author email
             start_date: Filter commits from this date
             end_date: Filter commits until this date
+            all_branches: Read every branch instead of one; each commit is listed once
+                with the names of the branches containing it under 'branches'
+            paths: Only commits changing files under these paths
             
         Returns:
-            List of commit data dictionaries
+            List of CommitRecord objects
         """
-        temp_dir = None
-        try:
-            repo = self._get_repo(repo_path)
-            
-            # Check if the specified branch exists
-            if branch not in [ref.name.split('/')[-1] for ref in repo.references]:
-                # Try with origin/branch_name
-                origin_branch = f"origin/{branch}"
-                if origin_branch not in [ref.name for ref in repo.references]:
-                    # If branch doesn't exist, use the default branch
-                    branch = repo.active_branch.name
-            
+        return list(self.iter_commits(repo_path, branch, username, email, start_date, end_date, all_branches,
+                                      paths))
+    
+    def iter_commits(self, repo_path, branch='main', username=None, email=None, start_date=None, end_date=None,
+                     all_branches=False, paths=None):
+        """
+        Stream commits from a git repository as they are read from git
+        
+        Takes the same arguments as get_commits.
+        
+        Yields:
+            CommitRecord objects
+        """
+        # The mirror stays in place while the walk below reads it
+        with self.open_repo(repo_path, start_date=start_date, paths=None if all_branches else paths) as repo:
+        
+            if all_branches:
+                yield from self._iter_all_branches(repo, username, email, start_date, end_date, paths)
+                return
+        
+            branch = self.resolve_branch(repo, branch)
+        
             # Get commits
-            commits = []
+            returned = 0
             try:
-                for commit in repo.iter_commits(branch):
+                rev_options = self._rev_walk_options(username, email, start_date, end_date)
+                # One streaming `git log` process lists the changed files of every commit
+                log = iter_git_log(repo.git_dir, branch, rev_options, paths=paths)
+                for commit in metrics.timed(log, 'walk', 'git', counter='commits_walked'):
                     # Apply filters
-                    if username and commit.author.name.lower() != username.lower():
+                    if username and commit.author_name.lower() != username.lower():
                         continue
-                    
-                    if email and commit.author.email.lower() != email.lower():
+                
+                    if email and commit.author_email.lower() != email.lower():
+                        continue
+                
+                    if start_date and commit.date < start_date:
                         continue
                     
-                    commit_date = datetime.fromtimestamp(commit.committed_date)
-                    
-                    if start_date and commit_date < start_date:
+                    if end_date and commit.date > end_date:
                         continue
-                        
-                    if end_date and commit_date > end_date:
+                
+                    if paths and not touches_paths(commit.files_changed, paths):
                         continue
-                    
-                    # Get list of files changed in this commit
-                    files_changed = []
-                    try:
-                        if commit.parents:
-                            diffs = commit.parents[0].diff(commit)
-                            files_changed = [diff.a_path for diff in diffs]
-                    except Exception:
-                        # If we can't get the files changed, just continue
-                        pass
-                    
-                    commits.append({
-                        'commit_hash': commit.hexsha,
-                        'author_name': commit.author.name,
-                        'author_email': commit.author.email,
-                        'date': commit_date,
-                        'message': commit.message,
-                        'files_changed': files_changed
-                    })
+                
+                    returned += 1
+                    yield commit
             except git.GitCommandError as e:
                 raise ValueError(f"Failed to fetch commits: {str(e)}")
+            finally:
+                metrics.count('commits_returned', returned, provider='git')
+    
+    def _iter_all_branches(self, repo, username=None, email=None, start_date=None, end_date=None, paths=None):
+        """
+        Stream the commits of every branch from one topologically ordered walk
+        
+        Author, end date and path filters would hide commits from git and break
+        the hand-down of branch names to parents, so only the start date is
+        pushed down to git and the other filters are applied here.
+        """
+        tips = self._branch_tips(repo)
+        if not tips:
+            return
+        tracker = BranchTracker(tips)
+        
+        # Newest first like a single branch, but never a parent before its children
+        options = ['--date-order']
+        if start_date:
+            options.append(f"--since=@{int(start_date.timestamp())}")
+        
+        returned = 0
+        try:
+            log = iter_git_log(repo.git_dir, sorted(set(tips.values())), options, with_parents=True)
+            for commit, parents in metrics.timed(log, 'walk', 'git', counter='commits_walked'):
+                commit.branches = tracker.visit(commit.commit_hash, parents)
                 
-            return commits
-            
+                if username and commit.author_name.lower() != username.lower():
+                    continue
+                
+                if email and commit.author_email.lower() != email.lower():
+                    continue
+                
+                if start_date and commit.date < start_date:
+                    continue
+                
+                if end_date and commit.date > end_date:
+                    continue
+                
+                if paths and not touches_paths(commit.files_changed, paths):
+                    continue
+                
+                returned += 1
+                yield commit
+        except git.GitCommandError as e:
+            raise ValueError(f"Failed to fetch commits: {str(e)}")
         finally:
-            # Clean up temporary directory if it was created
-            if temp_dir and os.path.exists(temp_dir):
-                shutil.rmtree(temp_dir, ignore_errors=True)
\ No newline at end of file
+            metrics.count('commits_returned', returned, provider='git')
@@ -0,0 +1,58 @@
+import threading
+from github.Requester import Requester, HTTPRequestsConnectionClass, HTTPSRequestsConnectionClass
+from .http_cache import make_adapter
+
+# PyGithub keeps one connection object per client and splits each call into
+# request() and getresponse() on it, which is not safe when several threads
+# fetch through the same client. The classes below give every request its own
+# connection object, while all of them share one pooled (and, if enabled,
+# caching) adapter per host so that TCP/TLS connections are still reused.
+
+_adapters = {}
+_adapters_lock = threading.Lock()
+
+
+def get_shared_adapter(protocol, host, port, retry, pool_size):
+    """
+    Get the process-wide adapter (and so connection pool) for a GitHub API host
+    """
+    key = (protocol, host, port)
+    with _adapters_lock:
+        adapter = _adapters.get(key)
+        if adapter is None:
+            adapter = make_adapter(
+                provider='github',
+                max_retries=retry,
+                pool_connections=pool_size,
+                pool_maxsize=pool_size,
+            )
+            _adapters[key] = adapter
+    return adapter
+
+
+class PooledHTTPSConnection(HTTPSRequestsConnectionClass):
+    def __init__(self, host, port=None, strict=False, timeout=None, retry=None, pool_size=None, **kwargs):
+        super().__init__(host, port, strict, timeout, retry, pool_size, **kwargs)
+        self.adapter = get_shared_adapter(self.protocol, self.host, self.port, self.retry, self.pool_size)
+        self.session.mount(f"{self.protocol}://", self.adapter)
+
+    def close(self):
+        # The shared adapter outlives this connection object
+        pass
+
+
+class PooledHTTPConnection(HTTPRequestsConnectionClass):
+    def __init__(self, host, port=None, strict=False, timeout=None, retry=None, pool_size=None, **kwargs):
+        super().__init__(host, port, strict, timeout, retry, pool_size, **kwargs)
+        self.adapter = get_shared_adapter(self.protocol, self.host, self.port, self.retry, self.pool_size)
+        self.session.mount(f"{self.protocol}://", self.adapter)
+
+    def close(self):
+        pass
+
+
+def install():
+    """
+    Make PyGithub use per-request connection objects over shared pools
+    """
+    Requester.injectConnectionClasses(PooledHTTPConnection, PooledHTTPSConnection)
@@ -1,13 +1,202 @@
 from github import Github
-from datetime import datetime
+from datetime import datetime, timezone
+from django.conf import settings
+from .. import metrics
+from .records import CommitRecord, touches_paths
+from .concurrency import imap_ordered
+from .branches import BranchTracker, collect_branch_graph, topo_order
+from . import github_connection
+
+# File lists are fetched from several threads through one client
+github_connection.install()
+
+# Largest page size the GitHub commits endpoint accepts
+GITHUB_PAGE_SIZE = 100
 
 class GitHubService:
     """
     Service for working with GitHub repositories
     """
     
+    def _commit_filters(self, branch, username=None, email=None, start_date=None, end_date=None, paths=None):
+        """
+        Build the server-side filters for the commits endpoint
+        
+        GitHub takes a single `path`, so the exact comparisons in get_commits
+        still apply afterwards. `since` and `until` compare committer dates,
+        which is what _iter_matching compares too.
+        
+        A username is never sent as `author`: GitHub matches it against the
+        linked account only, while get_commits also matches the git author name
+        of commits whose author has no account.
+        """
+        filters = {'sha': branch}
+        if start_date:
+            # PyGithub formats these as UTC without converting them
+            filters['since'] = start_date.astimezone(timezone.utc)
+        if end_date:
+            filters['until'] = end_date.astimezone(timezone.utc)
+        if email:
+            filters['author'] = email
+        if paths and len(paths) == 1:
+            filters['path'] = paths[0]
+        return filters
+    
+    def _committed(self, commit):
+        # Committer date; GitHub lists commits by it and since/until compare it
+        committer = commit.commit.committer or commit.commit.author
+        return committer.date
+    
+    def _iter_matching(self, commits, username=None, email=None, start_date=None, end_date=None):
+        """
+        Yield (commit, author_name, author_email, commit_date) for commits that pass the filters
+        """
+        for commit in commits:
+            # Get author information
+            author_name = "Unknown"
+            author_email = "unknown@email.com"
+            
+            if commit.author:
+                author_name = commit.author.login
+            
+            if commit.commit.author:
+                if not author_name or author_name == "Unknown":
+                    author_name = commit.commit.author.name
+                author_email = commit.commit.author.email
+            
+            # Apply filters
+            if username and author_name.lower() != username.lower():
+                continue
+            
+            if email and author_email.lower() != email.lower():
+                continue
+            
+            commit_date = commit.commit.author.date
+            
+            # The window is on committer dates, like GitHub's since/until and
+            # git's --since/--until; a rebased commit keeps an older author date
+            committed = self._committed(commit)
+            
+            if start_date and committed < start_date:
+                continue
+                
+            if end_date and committed > end_date:
+                continue
+            
+            yield commit, author_name, author_email, commit_date
+    
+    def _get_files_changed(self, matched):
+        commit = matched[0]
+        with metrics.phase('diffs', 'github'):
+            return [file.filename for file in commit.files]
+    
+    def _get_client(self, auth_token=None):
+        """
+        Create a GitHub API client for the given token
+        """
+        # Concurrent file list requests are bounded by the worker pool, so the
+        # client's own request spacing is disabled and its pool sized to match
+        client_options = {
+            'base_url': settings.GITHUB_API_URL,
+            'per_page': GITHUB_PAGE_SIZE,
+            'pool_size': settings.PROVIDER_FETCH_CONCURRENCY,
+            'seconds_between_requests': None,
+        }
+        if auth_token:
+            gh = Github(auth_token, **client_options)
+        else:
+            gh = Github(**client_options)
+        return gh
+    
+    def _parse_repo_path(self, repo_path):
+        """
+        Get 'owner/repo' from a repository path or URL
+        """
+        if 'github.com/' in repo_path:
+            repo_path = repo_path.split('github.com/')[-1]
+            # Remove .git extension if present
+            if repo_path.endswith('.git'):
+                repo_path = repo_path[:-4]
+        return repo_path
+    
+    def get_branch_tip(self, repo_path, branch='main', auth_token=None):
+        """
+        Get the commit the branch currently points to, with one branches API request
+        
+        Args:
+            repo_path: Path to the repository in format 'username/repo'
+            branch: Branch name
+            auth_token: GitHub authentication token
+            
+        Returns:
+            Commit SHA string
+        """
+        try:
+            # A lazy repository object skips the request for the repository itself
+            repo = self._get_client(auth_token).get_repo(self._parse_repo_path(repo_path), lazy=True)
+            with metrics.phase('ref', 'github'):
+                return repo.get_branch(branch).commit.sha
+        except Exception as e:
+            raise ValueError(f"Failed to fetch branch from GitHub: {str(e)}")
+    
+    def list_branch_tips(self, repo_path, auth_token=None):
+        """
+        Get the commit every branch currently points to, from the branches listing
+        
+        Args:
+            repo_path: Path to the repository in format 'username/repo'
+            auth_token: GitHub authentication token
+            
+        Returns:
+            Dict of branch name -> commit SHA
+        """
+        try:
+            repo = self._get_client(auth_token).get_repo(self._parse_repo_path(repo_path), lazy=True)
+            with metrics.phase('ref', 'github'):
+                return {branch.name: branch.commit.sha for branch in repo.get_branches()}
+        except Exception as e:
+            raise ValueError(f"Failed to fetch branches from GitHub: {str(e)}")
+    
+    def _iter_all_branches(self, repo, username=None, email=None, start_date=None, end_date=None):
+        """
+        Yield (commit, author_name, author_email, commit_date, branches) for the
+        matching commits of every branch, each commit once
+        
+        The branches' commit listings are merged into one graph, and each listing
+        stops as soon as the rest of its history was already read with an earlier
+        branch. Branch names are then handed down the graph in one pass. Author and
+        end date filters would leave holes in the listings, so only the start date
+        is sent to GitHub.
+        """
+        with metrics.phase('ref', 'github'):
+            tips = {branch.name: branch.commit.sha for branch in repo.get_branches()}
+        # The default branch usually holds most of the history, so read it first
+        names = sorted(tips, key=lambda name: name != repo.default_branch)
+        
+        since = {}
+        if start_date:
+            since['since'] = start_date.astimezone(timezone.utc)
+        
+        def listing(name):
+            commits = repo.get_commits(sha=name, **since)
+            for commit in metrics.timed(commits, 'pagination', 'github', counter='commits_walked'):
+                yield commit.sha, [parent.sha for parent in commit.parents], commit
+        
+        graph = collect_branch_graph(listing(name) for name in names)
+        
+        tracker = BranchTracker(tips)
+        branches = {}
+        for sha in topo_order({sha: parents for sha, (parents, _) in graph.items()}):
+            branches[sha] = tracker.visit(sha, graph[sha][0])
+        
+        # Newest first, like a single branch listing
+        commits = sorted((commit for _, commit in graph.values()), key=self._committed, reverse=True)
+        for commit, author_name, author_email, commit_date in self._iter_matching(
+                commits, username, email, start_date, end_date):
+            yield commit, author_name, author_email, commit_date, branches[commit.sha]
+    
     def get_commits(self, repo_path, branch='main', username=None, email=None, 
-                    start_date=None, end_date=None, auth_token=None):
+                    start_date=None, end_date=None, auth_token=None, all_branches=False, paths=None):
         """
         Get commits from a GitHub repository
         
@@ -19,76 +208,80 @@ class GitHubService:
             start_date: Filter commits from this date
             end_date: Filter commits until this date
             auth_token: GitHub authentication token
+            all_branches: Read every branch instead of one; each commit is listed once
+                with the names of the branches containing it under 'branches'
+            paths: Only commits changing files under these paths
             
         Returns:
-            List of commit data dictionaries
+            List of CommitRecord objects
         """
+        return list(self.iter_commits(repo_path, branch, username, email, start_date, end_date, auth_token,
+                                      all_branches, paths))
+    
+    def iter_commits(self, repo_path, branch='main', username=None, email=None, 
+                     start_date=None, end_date=None, auth_token=None, all_branches=False, paths=None):
+        """
+        Stream commits from a GitHub repository page by page
+        
+        Takes the same arguments as get_commits.
+        
+        Yields:
+            CommitRecord objects
+        """
+        returned = 0
         try:
-            # Initialize GitHub API client
-            if auth_token:
-                gh = Github(auth_token)
-            else:
-                gh = Github()
-            
-            # Format repo path correctly
-            if 'github.com/' in repo_path:
-                repo_path = repo_path.split('github.com/')[-1]
-                # Remove .git extension if present
-                if repo_path.endswith('.git'):
-                    repo_path = repo_path[:-4]
+            gh = self._get_client(auth_token)
+            repo_path = self._parse_repo_path(repo_path)
             
             # Get repository
-            repo = gh.get_repo(repo_path)
+            with metrics.phase('repo', 'github'):
+                repo = gh.get_repo(repo_path)
             
-            # Get commits
-            commits_list = []
+            if all_branches:
+                # Files are fetched once per unique commit, however many branches contain it
+                matching = self._iter_all_branches(repo, username, email, start_date, end_date)
+                for (commit, author_name, author_email, commit_date, branches), files_changed in imap_ordered(self._get_files_changed, matching):
+                    if paths and not touches_paths(files_changed, paths):
+                        continue
+                    returned += 1
+                    yield CommitRecord(
+                        commit.sha,
+                        author_name,
+                        author_email,
+                        commit_date,
+                        commit.commit.message,
+                        files_changed,
+                        branches=branches,
+                        order_date=self._committed(commit)
+                    )
+                return
             
-            # Get commits from GitHub API
-            commits = repo.get_commits(sha=branch)
+            # Get commits from GitHub API, letting GitHub apply the date, author and
+            # path filters so pagination ends with the requested window
+            commits = repo.get_commits(**self._commit_filters(branch, username, email, start_date, end_date, paths))
+            commits = metrics.timed(commits, 'pagination', 'github', counter='commits_walked')
             
-            for commit in commits:
-                # Get author information
-                author_name = "Unknown"
-                author_email = "unknown@email.com"
-                
-                if commit.author:
-                    author_name = commit.author.login
-                
-                if commit.commit.author:
-                    if not author_name or author_name == "Unknown":
-                        author_name = commit.commit.author.name
-                    author_email = commit.commit.author.email
-                
-                # Apply filters
-                if username and author_name.lower() != username.lower():
-                    continue
-                
-                if email and author_email.lower() != email.lower():
-                    continue
-                
-                commit_date = commit.commit.author.date
-                
-                if start_date and commit_date < start_date:
-                    continue
-                    
-                if end_date and commit_date > end_date:
-                    continue
-                
-                # Get files changed
-                files_changed = [file.filename for file in commit.files]
-                
-                commit_data = {
-                    'commit_hash': commit.sha,
-                    'author_name': author_name,
-                    'author_email': author_email,
-                    'date': commit_date,
-                    'message': commit.commit.message,
-                    'files_changed': files_changed
-                }
-                
-                commits_list.append(commit_data)
+            matching = self._iter_matching(commits, username, email, start_date, end_date)
             
-            return commits_list
+            # Each commit's file list is a separate API request; fetch them on a
+            # bounded pool over the pooled connections, keeping commit order
+            for (commit, author_name, author_email, commit_date), files_changed in imap_ordered(self._get_files_changed, matching):
+                # Several paths can't be sent, and GitHub's history simplification
+                # may list merges; both are settled on the file lists
+                if paths and not touches_paths(files_changed, paths):
+                    continue
+                returned += 1
+                yield CommitRecord(
+                    commit.sha,
+                    author_name,
+                    author_email,
+                    commit_date,
+                    commit.commit.message,
+                    files_changed,
+                    order_date=self._committed(commit)
+                )
             
         except Exception as e:
-            raise ValueError(f"Failed to fetch commits from GitHub: {str(e)}")
\ No newline at end of file
+            raise ValueError(f"Failed to fetch commits from GitHub: {str(e)}")
+        finally:
+            metrics.count('commits_returned', returned, provider='github')
\ No newline at end of file
@@ -0,0 +1,228 @@
+import os
+import re
+import json
+import hashlib
+import tempfile
+import threading
+import requests
+from requests.structures import CaseInsensitiveDict
+from django.conf import settings
+from .. import metrics
+
+# Per-sha resources (a commit, its diffstat or file list) never change once created,
+# so their cached bodies are served without revalidation
+IMMUTABLE_URL = re.compile(r'/(?:commits?|diffstat|diff|patch)/[0-9a-fA-F]{40}(?:[/?]|$)')
+
+# Body encodings are already undone when a response is cached
+DROPPED_HEADERS = {'content-encoding', 'content-length', 'transfer-encoding', 'connection'}
+
+# Eviction scans the cache directory, so only do it every so many writes
+EVICT_EVERY_WRITES = 100
+
+
+class HTTPCache:
+    """
+    On-disk store of GET responses keyed by URL and credentials
+    """
+
+    def __init__(self, cache_dir=None, max_bytes=None):
+        self.cache_dir = cache_dir or settings.HTTP_CACHE_DIR
+        self.max_bytes = max_bytes if max_bytes is not None else settings.HTTP_CACHE_MAX_BYTES
+        self._writes = 0
+        self._lock = threading.Lock()
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def key(self, request):
+        """
+        Cache key for a prepared request
+
+        The Authorization header is part of the key, so responses fetched with
+        one set of credentials are never served to another.
+        """
+        parts = [
+            request.method,
+            request.url,
+            request.headers.get('Accept', ''),
+            hashlib.sha256(request.headers.get('Authorization', '').encode('utf-8')).hexdigest(),
+        ]
+        return hashlib.sha256('\n'.join(parts).encode('utf-8')).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key[:2], key)
+
+    def get(self, key):
+        """
+        Get a cached entry as (metadata, body), or None
+        """
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                meta = json.loads(f.readline())
+                body = f.read()
+            # Reads count as use for least-recently-used eviction
+            os.utime(path)
+        except (OSError, ValueError):
+            return None
+        return meta, body
+
+    def set(self, key, response, immutable=False):
+        """
+        Store a response's status, headers and body
+        """
+        meta = {
+            'status': response.status_code,
+            'reason': response.reason,
+            'headers': {k: v for k, v in response.headers.items() if k.lower() not in DROPPED_HEADERS},
+            'immutable': immutable,
+        }
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write to a temporary file and rename, so readers never see a partial entry
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(json.dumps(meta).encode('utf-8') + b'\n')
+                f.write(response.content)
+            os.replace(temp_path, path)
+        except OSError:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            return
+
+        with self._lock:
+            self._writes += 1
+            evict = self._writes % EVICT_EVERY_WRITES == 0
+        if evict:
+            self.evict()
+
+    def evict(self):
+        """
+        Remove least recently used entries until the cache is within max_bytes
+        """
+        entries = []
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+        entries.sort()
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+
+
+class MeteredHTTPAdapter(requests.adapters.HTTPAdapter):
+    """
+    requests adapter that counts the requests it sends in the api_calls metric
+    """
+
+    def __init__(self, provider=None, **kwargs):
+        self.provider = provider
+        super().__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        metrics.count('api_calls', provider=self.provider)
+        return super().send(request, **kwargs)
+
+
+class CachingHTTPAdapter(MeteredHTTPAdapter):
+    """
+    requests adapter that answers GETs from an HTTPCache
+
+    Immutable per-sha resources are served straight from the cache. Everything
+    else is revalidated with If-None-Match / If-Modified-Since, and a 304 reply
+    is turned back into the cached response. GitHub does not count 304 replies
+    against the rate limit.
+    """
+
+    def __init__(self, cache=None, **kwargs):
+        self.cache = cache or get_default_cache()
+        super().__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        if request.method != 'GET' or kwargs.get('stream'):
+            return super().send(request, **kwargs)
+
+        key = self.cache.key(request)
+        immutable = bool(IMMUTABLE_URL.search(request.url))
+        cached = self.cache.get(key)
+        if cached:
+            meta, body = cached
+            if meta['immutable']:
+                metrics.count('cache_hits', cache='http')
+                return self._cached_response(request, meta, body)
+            if meta['headers'].get('ETag'):
+                request.headers['If-None-Match'] = meta['headers']['ETag']
+            if meta['headers'].get('Last-Modified'):
+                request.headers['If-Modified-Since'] = meta['headers']['Last-Modified']
+
+        response = super().send(request, **kwargs)
+
+        if response.status_code == 304 and cached:
+            metrics.count('cache_hits', cache='http')
+            meta, body = cached
+            cached_response = self._cached_response(request, meta, body)
+            # Rate limit and similar headers on the 304 are the fresh ones
+            cached_response.headers.update(
+                {k: v for k, v in response.headers.items() if k.lower() not in DROPPED_HEADERS}
+            )
+            response.close()
+            return cached_response
+
+        metrics.count('cache_misses', cache='http')
+        if response.status_code == 200 and (
+            immutable or 'ETag' in response.headers or 'Last-Modified' in response.headers
+        ):
+            self.cache.set(key, response, immutable=immutable)
+        return response
+
+    def _cached_response(self, request, meta, body):
+        response = requests.Response()
+        response.status_code = meta['status']
+        response.reason = meta.get('reason')
+        response.headers = CaseInsensitiveDict(meta['headers'])
+        response._content = body
+        response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+        response.url = request.url
+        response.request = request
+        response.connection = self
+        response.from_cache = True
+        return response
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_default_cache():
+    """
+    Get the process-wide HTTPCache configured in settings
+    """
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = HTTPCache()
+    return _default_cache
+
+
+def make_adapter(provider=None, **kwargs):
+    """
+    Create an HTTP adapter for provider API calls, caching responses if HTTP_CACHE_ENABLED
+
+    Args:
+        provider: 'github' or 'bitbucket', the label its calls are counted under
+        kwargs: HTTPAdapter arguments
+    """
+    if settings.HTTP_CACHE_ENABLED:
+        return CachingHTTPAdapter(provider=provider, **kwargs)
+    return MeteredHTTPAdapter(provider=provider, **kwargs)
@@ -0,0 +1,66 @@
+import sys
+
+COMMIT_FIELDS = ('commit_hash', 'author_name', 'author_email', 'date', 'message', 'files_changed')
+
+
+class CommitRecord:
+    """
+    Compact commit as produced by the services
+
+    Slots instead of a per-commit dict, and author names, emails and paths are
+    interned so every repeat of one shares a single string object. files_changed
+    is a tuple. branches is only set for all-branches reports; reading it
+    otherwise raises AttributeError, which CommitSerializer treats as absent.
+
+    order_date is only set when the service lists and filters commits by
+    another date than the one reported, like GitHub's committer date; it is
+    not part of the output and not compared. See order_date().
+    """
+    __slots__ = COMMIT_FIELDS + ('branches', 'order_date')
+
+    def __init__(self, commit_hash, author_name, author_email, date, message, files_changed=(), branches=None,
+                 order_date=None):
+        self.commit_hash = commit_hash
+        self.author_name = _intern(author_name)
+        self.author_email = _intern(author_email)
+        self.date = date
+        self.message = message
+        self.files_changed = tuple([_intern(path) for path in files_changed])
+        if branches is not None:
+            self.branches = branches
+        if order_date is not None and order_date != date:
+            self.order_date = order_date
+
+    def __eq__(self, other):
+        if not isinstance(other, CommitRecord):
+            return NotImplemented
+        return all(
+            getattr(self, name, None) == getattr(other, name, None)
+            for name in COMMIT_FIELDS + ('branches',)
+        )
+
+    def __repr__(self):
+        return f"<CommitRecord {self.commit_hash}>"
+
+
+def order_date(commit):
+    """
+    Date a commit is listed newest first by, and end_date compared with, in its report
+    """
+    return getattr(commit, 'order_date', commit.date)
+
+
+def touches_paths(files_changed, paths):
+    """
+    Whether any changed file is one of paths or lies under one of them
+
+    Paths are literal, like git's --literal-pathspecs: 'services/billing'
+    matches 'services/billing/models.py' but not 'services/billing_v2.py'.
+    """
+    prefixes = tuple(path.rstrip('/') + '/' for path in paths)
+    return any(changed in paths or changed.startswith(prefixes) for changed in files_changed)
+
+
+def _intern(value):
+    # Providers may leave an author field empty (None)
+    return sys.intern(value) if type(value) is str else value
@@ -0,0 +1,79 @@
+from collections import Counter
+from datetime import timezone
+
+# Directory reported for files at the repository root
+ROOT_DIRECTORY = '/'
+
+
+class CommitStats:
+    """
+    Commit counts per author, per day and per top-level directory
+
+    Built in one pass over a commit stream; only the counters are kept, so
+    memory depends on the number of authors, days and directories, not on the
+    number of commits.
+    """
+
+    def __init__(self):
+        self.commits_count = 0
+        self.authors = Counter()
+        # Most common spelling of each author's name, per lowercased email
+        self.author_names = {}
+        self.days = Counter()
+        self.directory_commits = Counter()
+        self.directory_files = Counter()
+
+    def add(self, commit):
+        """
+        Count one CommitRecord
+        """
+        self.commits_count += 1
+
+        # API commits without a linked author may have no email
+        email = (commit.author_email or '').lower()
+        self.authors[email] += 1
+        self.author_names.setdefault(email, Counter())[commit.author_name] += 1
+
+        self.days[commit.date.astimezone(timezone.utc).date()] += 1
+
+        directories = Counter(
+            path.split('/', 1)[0] if '/' in path else ROOT_DIRECTORY
+            for path in commit.files_changed
+        )
+        self.directory_commits.update(directories.keys())
+        self.directory_files.update(directories)
+
+    def update(self, commits):
+        """
+        Count every commit of an iterable
+
+        Returns:
+            self
+        """
+        for commit in commits:
+            self.add(commit)
+        return self
+
+    def as_dict(self):
+        """
+        Summary tables: authors and directories by descending commit count, days in date order
+        """
+        return {
+            "commits_count": self.commits_count,
+            "authors": [
+                {
+                    "author_name": self.author_names[email].most_common(1)[0][0],
+                    "author_email": email,
+                    "commits": count
+                }
+                for email, count in self.authors.most_common()
+            ],
+            "days": [
+                {"date": day.isoformat(), "commits": self.days[day]}
+                for day in sorted(self.days)
+            ],
+            "directories": [
+                {"directory": directory, "commits": count, "files_changed": self.directory_files[directory]}
+                for directory, count in self.directory_commits.most_common()
+            ]
+        }
@@ -1,6 +1,19 @@
 from django.urls import path
-from .views import CommitsView
+from django.views.decorators.csrf import csrf_exempt
+from .views import CommitsView, AsyncCommitsView, BatchCommitsView, CommitStatsView, ReportJobsView, ReportJobView, TrackedRepositoriesView, TrackedRepositoryView, WebhookView, MetricsView
 
 urlpatterns = [
     path('commits/', CommitsView.as_view(), name='commits'),
+    path('commits/stats/', CommitStatsView.as_view(), name='commits-stats'),
+    path('commits/batch/', BatchCommitsView.as_view(), name='commits-batch'),
+    # Token-authenticated JSON API like CommitsView, which DRF exempts from CSRF
+    path('commits/async/', csrf_exempt(AsyncCommitsView.as_view()), name='commits-async'),
+    path('jobs/', ReportJobsView.as_view(), name='report-jobs'),
+    path('jobs/<uuid:job_id>/', ReportJobView.as_view(), name='report-job'),
+    path('tracked/', TrackedRepositoriesView.as_view(), name='tracked-repositories'),
+    path('tracked/<int:pk>/', TrackedRepositoryView.as_view(), name='tracked-repository'),
+    # Authenticated by their HMAC signature instead
+    path('webhooks/github/', csrf_exempt(WebhookView.as_view(provider='github')), name='webhook-github'),
+    path('webhooks/bitbucket/', csrf_exempt(WebhookView.as_view(provider='bitbucket')), name='webhook-bitbucket'),
+    path('metrics/', MetricsView.as_view(), name='metrics'),
 ]
@@ -1,20 +1,38 @@
+import json
+import time
+import asyncio
+from itertools import islice
+from django.http import HttpResponse, StreamingHttpResponse
+from django.urls import reverse
+from django.views import View
 from rest_framework import status
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from .serializers import CommitRequestSerializer, CommitSerializer
-from .services.git_service import GitService
-from .services.github_service import GitHubService
-from .services.bitbucket_service import BitbucketService
+from rest_framework.renderers import JSONRenderer
+from . import metrics
+from .serializers import CommitRequestSerializer, BatchCommitRequestSerializer, TrackedRepositorySerializer
+from .encoders import CommitEncoder
+from .reports import iter_report_commits, report_page, page_fields, prime, get_report_executor, report_summary, report_filters
+from .batch import batch_report_params, iter_batch_results
+from .jobs import submit_report_job, wait_for_job
+from .models import ReportJob, TrackedRepository
+from .prefetch import track_repository
+from .webhooks import verify_delivery, delivery_event, parse_push, apply_push
+from .stats import CommitStats
+
+# Commits rendered per thread hand-off when streaming from AsyncCommitsView
+NDJSON_CHUNK_SIZE = 100
+
 
 class CommitsView(APIView):
     """
     API endpoint to fetch git commits from repositories
     """
-    
+
     def post(self, request):
         """
         Fetch commits based on request parameters
-        
+
         Request body parameters:
         - repo_path: Path to repository (local path or remote URL)
         - repo_type: Type of repository (local, github, bitbucket)
@@ -23,90 +41,451 @@ class CommitsView(APIView):
         - start_date: Filter commits from this date (optional)
         - end_date: Filter commits until this date (optional)
         - branch: Branch to fetch commits from (optional, defaults to 'main')
+        - all_branches: Fetch every branch instead, listing each commit once with its branches (optional)
+        - paths: Only commits changing files at or under these repository paths (optional)
         - auth_token: Authentication token for GitHub/Bitbucket (optional)
         - auth_username: Authentication username for Bitbucket (optional)
+        - format: 'json' (default) or 'ndjson' to stream one commit per line (optional)
+        - limit: Return at most this many commits and a next_cursor (optional)
+        - cursor: next_cursor from the previous page (optional)
         """
         serializer = CommitRequestSerializer(data=request.data)
-        
+
         if not serializer.is_valid():
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
-        
+
         data = serializer.validated_data
-        repo_path = data['repo_path']
-        repo_type = data['repo_type']
-        username = data.get('username')
-        email = data.get('email')
-        start_date = data.get('start_date')
-        end_date = data.get('end_date')
-        branch = data.get('branch', 'main')
-        auth_token = data.get('auth_token')
-        auth_username = data.get('auth_username')
-        
+
         try:
-            commits = []
-            
-            if repo_type == 'local':
-                # Use GitService for local repositories
-                git_service = GitService()
-                commits = git_service.get_commits(
-                    repo_path=repo_path,
-                    branch=branch,
-                    username=username,
-                    email=email,
-                    start_date=start_date,
-                    end_date=end_date
-                )
-            elif repo_type == 'github':
-                # Use GitHubService for GitHub repositories
-                github_service = GitHubService()
-                commits = github_service.get_commits(
-                    repo_path=repo_path,
-                    branch=branch,
-                    username=username,
-                    email=email,
-                    start_date=start_date,
-                    end_date=end_date,
-                    auth_token=auth_token
-                )
-            elif repo_type == 'bitbucket':
-                # Use BitbucketService for Bitbucket repositories
-                bitbucket_service = BitbucketService()
-                commits = bitbucket_service.get_commits(
-                    repo_path=repo_path,
-                    branch=branch,
-                    username=username,
-                    email=email,
-                    start_date=start_date,
-                    end_date=end_date,
-                    auth_username=auth_username,
-                    auth_token=auth_token
+            # Streams are answered from the cache but not buffered to fill it
+            page = report_page(data, store=data.get('format') != 'ndjson')
+
+            if data.get('format') == 'ndjson':
+                # Fail before the first byte is sent if the repository can't be read
+                commits = prime(page)
+                return StreamingHttpResponse(
+                    ndjson_lines(commits, report_summary(data), page),
+                    content_type='application/x-ndjson'
                 )
-            else:
-                return Response(
-                    {"error": f"Unsupported repository type: {repo_type}"},
-                    status=status.HTTP_400_BAD_REQUEST
+
+            commits = list(page)
+            with metrics.phase('serialize'):
+                encoded = CommitEncoder().data_list(commits)
+
+            return Response(dict(
+                report_summary(data),
+                commits_count=len(commits),
+                commits=encoded,
+                **page_fields(page)
+            ))
+
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except Exception as e:
+            return Response(
+                {"error": f"An unexpected error occurred: {str(e)}"},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+
+class AsyncCommitsView(View):
+    """
+    Async variant of CommitsView for ASGI deployments
+
+    Accepts the same request body and returns the same responses as CommitsView.
+    The blocking provider work (git, GitHub and Bitbucket calls) runs on a bounded
+    thread pool, so a slow report only occupies a pool thread and the event loop
+    keeps serving other requests while it waits.
+    """
+
+    async def post(self, request):
+        try:
+            payload = json.loads(request.body or b'{}')
+        except ValueError as e:
+            return _json_response({"detail": f"JSON parse error - {str(e)}"}, status.HTTP_400_BAD_REQUEST)
+
+        serializer = CommitRequestSerializer(data=payload)
+        if not serializer.is_valid():
+            return _json_response(serializer.errors, status.HTTP_400_BAD_REQUEST)
+
+        data = serializer.validated_data
+        loop = asyncio.get_running_loop()
+        executor = get_report_executor()
+
+        try:
+            page = report_page(data, store=data.get('format') != 'ndjson')
+
+            # run_in_executor doesn't carry context over, so the pool threads
+            # are handed this request's metrics explicitly
+            if data.get('format') == 'ndjson':
+                commits = await loop.run_in_executor(executor, metrics.in_context(lambda: prime(page)))
+                return StreamingHttpResponse(
+                    _async_ndjson_lines(ndjson_lines(commits, report_summary(data), page), loop, executor),
+                    content_type='application/x-ndjson'
                 )
-            
-            # Serialize the commit data
-            commits_serializer = CommitSerializer(commits, many=True)
-            
-            return Response({
-                "repository": repo_path,
-                "branch": branch,
-                "filters": {
-                    "username": username,
-                    "email": email,
-                    "start_date": start_date,
-                    "end_date": end_date
-                },
-                "commits_count": len(commits),
-                "commits": commits_serializer.data
-            })
-            
+
+            # Encoding and rendering a large report takes as long as reading it,
+            # so it stays off the event loop as well
+            body = await loop.run_in_executor(executor, metrics.in_context(lambda: _render_report(data, page)))
+            return HttpResponse(body, content_type='application/json')
+
+        except ValueError as e:
+            return _json_response({"error": str(e)}, status.HTTP_400_BAD_REQUEST)
+        except Exception as e:
+            return _json_response(
+                {"error": f"An unexpected error occurred: {str(e)}"},
+                status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+
+class CommitStatsView(APIView):
+    """
+    API endpoint to summarize commits per author, day and top-level directory
+    """
+
+    def post(self, request):
+        """
+        Count the commits matching the request instead of returning them
+
+        Takes the same request body as /api/commits/ (format, limit and cursor
+        are ignored). Returns commits_count and three tables: authors (by email),
+        days (UTC) and directories (top-level directory of each changed file,
+        '/' for files at the root).
+        """
+        serializer = CommitRequestSerializer(data=request.data)
+
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        data = serializer.validated_data
+
+        try:
+            # One pass over the commit stream; commits are counted and dropped
+            stats = CommitStats().update(iter_report_commits(data, store=False))
+            return Response(dict(report_summary(data), **stats.as_dict()))
+
         except ValueError as e:
             return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
             return Response(
                 {"error": f"An unexpected error occurred: {str(e)}"},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
-            )
\ No newline at end of file
+            )
+
+
+class BatchCommitsView(APIView):
+    """
+    API endpoint to fetch git commits from several repositories at once
+    """
+
+    def post(self, request):
+        """
+        Fetch commits of every listed repository with shared filters
+
+        Request body parameters:
+        - repositories: List of {repo_path, repo_type, branch, auth_token, auth_username};
+          branch and credentials are optional and default to the batch-level values
+        - username, email, start_date, end_date, paths: Filters applied to every repository (optional)
+        - branch, auth_token, auth_username: Defaults for the repositories (optional)
+        - format: 'json' (default) or 'ndjson' to stream one line per repository as it finishes (optional)
+
+        Repositories run in parallel, limited per repo_type by BATCH_PROVIDER_CONCURRENCY.
+        A repository that fails is reported with status 'error' and does not fail the batch.
+        """
+        serializer = BatchCommitRequestSerializer(data=request.data)
+
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        data = serializer.validated_data
+        # The repositories may be of several types
+        metrics.set_provider('batch')
+        filters = report_filters(data)
+        results = iter_batch_results(batch_report_params(data))
+
+        if data.get('format') == 'ndjson':
+            return StreamingHttpResponse(
+                self._ndjson_lines(results, filters),
+                content_type='application/x-ndjson'
+            )
+
+        started = time.monotonic()
+        results = sorted(results, key=lambda result: result['index'])
+        rendered = [self._render_result(result) for result in results]
+        for result in rendered:
+            del result['index']
+
+        return Response(dict(
+            self._batch_summary(results, filters, started),
+            results=rendered
+        ))
+
+    def _ndjson_lines(self, results, filters):
+        renderer = JSONRenderer()
+        started = time.monotonic()
+        finished = []
+        for result in results:
+            finished.append(result)
+            yield renderer.render(self._render_result(result)) + b'\n'
+        yield renderer.render(self._batch_summary(finished, filters, started)) + b'\n'
+
+    def _render_result(self, result):
+        rendered = {key: value for key, value in result.items() if key != 'commits'}
+        if result['status'] == 'ok':
+            rendered['commits_count'] = len(result['commits'])
+            rendered['commits'] = CommitEncoder().data_list(result['commits'])
+        return rendered
+
+    def _batch_summary(self, results, filters, started):
+        failed = sum(1 for result in results if result['status'] != 'ok')
+        return {
+            "filters": filters,
+            "repositories_count": len(results),
+            "failed_count": failed,
+            "commits_count": sum(len(result.get('commits', ())) for result in results),
+            "elapsed_ms": round((time.monotonic() - started) * 1000)
+        }
+
+
+class ReportJobsView(APIView):
+    """
+    API endpoint to run a commits report in the background
+    """
+
+    def post(self, request):
+        """
+        Queue a report and return its job id right away
+
+        Takes the same request body as /api/commits/ (format is ignored). While a
+        job for the same repository, branch, filters and credentials is pending
+        or running, that job is returned instead of starting another one.
+        """
+        serializer = CommitRequestSerializer(data=request.data)
+
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        job, created = submit_report_job(serializer.validated_data)
+        return Response(
+            dict(job_response(job, request), deduplicated=not created),
+            status=status.HTTP_202_ACCEPTED
+        )
+
+
+class ReportJobView(APIView):
+    """
+    API endpoint to get the status and result of a report job
+    """
+
+    def get(self, request, job_id):
+        """
+        Get a report job
+
+        Query parameters:
+        - wait: Seconds to wait for the job to finish before answering (optional, long-poll)
+        """
+        try:
+            timeout = float(request.query_params.get('wait', 0))
+        except ValueError:
+            return Response({"error": "wait must be a number of seconds"}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            job = wait_for_job(job_id, timeout)
+        except ReportJob.DoesNotExist:
+            return Response({"error": "Job not found"}, status=status.HTTP_404_NOT_FOUND)
+
+        return Response(job_response(job, request))
+
+
+class TrackedRepositoriesView(APIView):
+    """
+    API endpoint to register repositories for background prefetching
+    """
+
+    def get(self, request):
+        """
+        List tracked repositories with their refresh status
+        """
+        tracked = TrackedRepository.objects.order_by('repo_type', 'key')
+        return Response([tracked_response(repository, request) for repository in tracked])
+
+    def post(self, request):
+        """
+        Track a repository, or update the branches and interval of a tracked one
+
+        Request body:
+        - repo_path: Path to repository (local path or remote URL)
+        - repo_type: Type of repository ('local', 'github', 'bitbucket')
+        - branches: Branches to keep fresh (optional, defaults to ['main'])
+        - refresh_interval: Seconds between refreshes (optional, defaults to PREFETCH_DEFAULT_INTERVAL)
+        """
+        serializer = TrackedRepositorySerializer(data=request.data)
+
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        data = serializer.validated_data
+        tracked, created = track_repository(
+            data['repo_type'],
+            data['repo_path'],
+            branches=data['branches'],
+            refresh_interval=data.get('refresh_interval')
+        )
+        return Response(
+            tracked_response(tracked, request),
+            status=status.HTTP_201_CREATED if created else status.HTTP_200_OK
+        )
+
+
+class TrackedRepositoryView(APIView):
+    """
+    API endpoint to get or stop tracking one repository
+    """
+
+    def get(self, request, pk):
+        try:
+            tracked = TrackedRepository.objects.get(pk=pk)
+        except TrackedRepository.DoesNotExist:
+            return Response({"error": "Tracked repository not found"}, status=status.HTTP_404_NOT_FOUND)
+        return Response(tracked_response(tracked, request))
+
+    def delete(self, request, pk):
+        deleted, _ = TrackedRepository.objects.filter(pk=pk).delete()
+        if not deleted:
+            return Response({"error": "Tracked repository not found"}, status=status.HTTP_404_NOT_FOUND)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class WebhookView(View):
+    """
+    Endpoint for GitHub and Bitbucket push webhooks
+
+    Deliveries must be signed with the provider's shared secret. Pushes update
+    the commit index of the pushed branches, so later reports on them need no
+    fetch or API call; other events are acknowledged and ignored.
+    """
+    # 'github' or 'bitbucket', set in urls.py
+    provider = None
+
+    def post(self, request):
+        metrics.set_provider(self.provider)
+        if not verify_delivery(self.provider, request.body, request.headers):
+            metrics.count('webhook_deliveries', provider=self.provider, outcome='rejected')
+            return _json_response({"error": "Invalid or missing signature"}, status.HTTP_403_FORBIDDEN)
+
+        event, is_push = delivery_event(self.provider, request.headers)
+        if not is_push:
+            metrics.count('webhook_deliveries', provider=self.provider, outcome='ignored')
+            return _json_response({"event": event, "ignored": True})
+
+        try:
+            repository, clone_url, updates = parse_push(self.provider, request.body)
+        except ValueError as e:
+            metrics.count('webhook_deliveries', provider=self.provider, outcome='invalid')
+            return _json_response({"error": str(e)}, status.HTTP_400_BAD_REQUEST)
+
+        branches = apply_push(self.provider, repository, clone_url, updates)
+        metrics.count('webhook_deliveries', provider=self.provider, outcome='applied')
+        return _json_response({"repository": repository, "branches": branches})
+
+
+class MetricsView(View):
+    """
+    Prometheus scrape endpoint for request latencies, phase timings and counters
+    """
+
+    def get(self, request):
+        return HttpResponse(metrics.REGISTRY.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+def job_response(job, request):
+    """
+    Status of a report job, with its result or error once finished
+    """
+    data = {
+        "job_id": str(job.id),
+        "status": job.status,
+        "status_url": request.build_absolute_uri(reverse('report-job', args=[job.id])),
+        "created_at": job.created_at,
+        "started_at": job.started_at,
+        "finished_at": job.finished_at,
+    }
+    if job.status == ReportJob.STATUS_SUCCEEDED:
+        data["result"] = job.result
+    elif job.status == ReportJob.STATUS_FAILED:
+        data["error"] = job.error
+    return data
+
+
+def tracked_response(tracked, request):
+    """
+    Registration and refresh status of a tracked repository
+    """
+    return {
+        "id": tracked.id,
+        "url": request.build_absolute_uri(reverse('tracked-repository', args=[tracked.id])),
+        "repo_type": tracked.repo_type,
+        "repo_path": tracked.repo_path,
+        "branches": tracked.branches,
+        "refresh_interval": tracked.refresh_interval,
+        "enabled": tracked.enabled,
+        "next_run_at": tracked.next_run_at,
+        "last_run_at": tracked.last_run_at,
+        "last_success_at": tracked.last_success_at,
+        "failures": tracked.failures,
+        "last_error": tracked.last_error,
+    }
+
+
+def ndjson_lines(commits, summary, page=None):
+    """
+    Render each commit as one JSON line as soon as it is read, followed by a
+    trailer line with the repository, branch, filters and commits_count, and
+    next_cursor when page is the CommitPage the commits are read from
+    """
+    renderer = JSONRenderer()
+    encoder = CommitEncoder()
+    commits_count = 0
+    try:
+        for commit in commits:
+            commits_count += 1
+            yield encoder.encode(commit) + b'\n'
+    except Exception as e:
+        # Headers are already sent; report the failure in-band and stop
+        yield renderer.render({"error": str(e)}) + b'\n'
+        return
+
+    yield renderer.render(dict(summary, commits_count=commits_count, **page_fields(page))) + b'\n'
+
+
+def _async_ndjson_lines(lines, loop, executor):
+    # Pull lines from the blocking generator in chunks to limit thread hand-offs.
+    # The context is captured now, while the view still runs in the request's
+    # context; the response is iterated after the view has returned
+    next_chunk = metrics.in_context(lambda: list(islice(lines, NDJSON_CHUNK_SIZE)))
+
+    async def chunks():
+        while True:
+            chunk = await loop.run_in_executor(executor, next_chunk)
+            if not chunk:
+                break
+            yield b''.join(chunk)
+    return chunks()
+
+
+def _render_report(data, page):
+    # The JSON body CommitsView responds with
+    commits = list(page)
+    with metrics.phase('serialize'):
+        encoded = CommitEncoder().data_list(commits)
+        return JSONRenderer().render(dict(
+            report_summary(data),
+            commits_count=len(commits),
+            commits=encoded,
+            **page_fields(page)
+        ))
+
+
+def _json_response(data, status_code=status.HTTP_200_OK):
+    # Same bytes and content type as DRF's JSONRenderer produces for CommitsView
+    return HttpResponse(JSONRenderer().render(data), status=status_code, content_type='application/json')
@@ -0,0 +1,321 @@
+import logging
+import hmac
+import json
+import hashlib
+import threading
+from datetime import datetime, timedelta, timezone
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.db import connections
+from django.utils import timezone as django_timezone
+from .models import TrackedRepository
+from .reports import normalize_repository
+from .services.commit_index import CommitIndex
+from .services.records import CommitRecord
+from .services.repo_cache import strip_credentials
+
+logger = logging.getLogger(__name__)
+
+# before/after of a push that created/deleted the branch
+ZERO_SHA = '0' * 40
+
+# GitHub lists at most this many commits in a push payload
+GITHUB_MAX_PUSH_COMMITS = 2048
+
+
+class PushUpdate:
+    """
+    One branch moved by a push
+
+    commits holds CommitRecords of the commits the branch gained, newest first,
+    or is None when the payload does not describe them completely.
+    """
+    __slots__ = ('branch', 'before', 'after', 'commits')
+
+    def __init__(self, branch, before, after, commits=None):
+        self.branch = branch
+        self.before = before
+        self.after = after
+        self.commits = commits
+
+    @property
+    def deleted(self):
+        return self.after == ZERO_SHA
+
+
+def parse_github_push(payload):
+    """
+    Get (repository, clone URL, updates) from a GitHub push payload
+
+    The payload's commits are the compare between before and after, with
+    their added, removed and modified files. They are used as they are unless
+    the branch was created or force-pushed, or the list may have been cut off.
+    Tag pushes have no updates.
+    """
+    repository = payload['repository']
+    updates = []
+    ref = payload['ref']
+    if ref.startswith('refs/heads/'):
+        before, after = payload['before'], payload['after']
+        listed = payload.get('commits') or []
+        commits = None
+        complete = (
+            not (payload.get('created') or payload.get('forced') or payload.get('deleted'))
+            and 0 < len(listed) < GITHUB_MAX_PUSH_COMMITS
+            and listed[-1]['id'] == after
+            and all('added' in commit and 'removed' in commit and 'modified' in commit for commit in listed)
+        )
+        if complete:
+            commits = [_github_commit(commit) for commit in reversed(listed)]
+        updates.append(PushUpdate(ref[len('refs/heads/'):], before, after, commits))
+    return repository['full_name'], repository['clone_url'], updates
+
+
+def _github_commit(commit):
+    author = commit.get('author') or {}
+    # Same shape as git log --name-only: deleted files included, sorted by path
+    files_changed = sorted(set(commit['added']) | set(commit['removed']) | set(commit['modified']))
+    message = commit['message']
+    if not message.endswith('\n'):
+        # git keeps the newline that ends a commit message; the payload drops it
+        message += '\n'
+    return CommitRecord(
+        commit['id'],
+        author.get('name'),
+        author.get('email'),
+        datetime.fromisoformat(commit['timestamp'].replace('Z', '+00:00')).astimezone(timezone.utc),
+        message,
+        files_changed
+    )
+
+
+def parse_bitbucket_push(payload):
+    """
+    Get (repository, clone URL, updates) from a Bitbucket push payload
+
+    Bitbucket lists at most five commits per change and never their files, so
+    its updates never carry commits and are always ingested from git.
+    """
+    repository = payload['repository']
+    updates = []
+    for change in payload['push']['changes']:
+        new, old = change.get('new'), change.get('old')
+        ref = new or old
+        if not ref or ref.get('type') != 'branch':
+            continue
+        updates.append(PushUpdate(
+            ref['name'],
+            old['target']['hash'] if old else ZERO_SHA,
+            new['target']['hash'] if new else ZERO_SHA
+        ))
+    # The repository's web URL is also its HTTPS clone URL
+    return repository['full_name'], repository['links']['html']['href'], updates
+
+
+# repo_type -> how its deliveries are signed, named and parsed, and whether
+# reports read what its pushes bring into the commit index (see
+# reports.webhook_branch: GitHub reports always use the API)
+WEBHOOK_PROVIDERS = {
+    'github': {
+        'signature_header': 'X-Hub-Signature-256',
+        'event_header': 'X-GitHub-Event',
+        'push_event': 'push',
+        'secret_setting': 'GITHUB_WEBHOOK_SECRET',
+        'parse': parse_github_push,
+        'indexed': False,
+    },
+    'bitbucket': {
+        'signature_header': 'X-Hub-Signature',
+        'event_header': 'X-Event-Key',
+        'push_event': 'repo:push',
+        'secret_setting': 'BITBUCKET_WEBHOOK_SECRET',
+        'parse': parse_bitbucket_push,
+        'indexed': True,
+    },
+}
+
+
+def indexes_pushes(repo_type):
+    """
+    Whether pushes to repositories of repo_type are brought into the commit index
+
+    Only when the index is enabled and reports of that provider read from it.
+    """
+    return settings.COMMIT_INDEX_ENABLED and WEBHOOK_PROVIDERS[repo_type]['indexed']
+
+
+def verify_signature(body, signature, secret):
+    """
+    Whether signature is 'sha256=' followed by the hex HMAC-SHA256 of body keyed with secret
+
+    Never true without a secret.
+    """
+    if not secret or not signature:
+        return False
+    algorithm, _, digest = signature.partition('=')
+    if algorithm != 'sha256':
+        return False
+    expected = hmac.new(secret.encode('utf-8'), body, hashlib.sha256).hexdigest()
+    return hmac.compare_digest(expected, digest.strip())
+
+
+def verify_delivery(repo_type, body, headers):
+    """
+    Whether a webhook delivery was signed with the provider's configured secret
+    """
+    provider = WEBHOOK_PROVIDERS[repo_type]
+    return verify_signature(
+        body,
+        headers.get(provider['signature_header']),
+        getattr(settings, provider['secret_setting'])
+    )
+
+
+def delivery_event(repo_type, headers):
+    """
+    Get the event name of a delivery and whether it is a push
+    """
+    provider = WEBHOOK_PROVIDERS[repo_type]
+    event = headers.get(provider['event_header'], '')
+    return event, event == provider['push_event']
+
+
+def parse_push(repo_type, body):
+    """
+    Parse a verified push delivery
+
+    Returns:
+        (repository full name, clone URL, list of PushUpdate) tuple
+
+    Raises:
+        ValueError: If the body is not a push payload
+    """
+    try:
+        return WEBHOOK_PROVIDERS[repo_type]['parse'](json.loads(body))
+    except (KeyError, TypeError, AttributeError) as e:
+        raise ValueError(f"Malformed push payload: missing {str(e)}")
+
+
+def apply_push(repo_type, repository, clone_url, updates):
+    """
+    Bring the commit index up to date with a verified push
+
+    Commits listed in full by the payload are stored directly. Other pushes
+    fetch only the pushed branch into the repository's mirror and ingest it,
+    in the background unless WEBHOOK_FETCH_IN_BACKGROUND is off. Nothing is
+    done or recorded for pushes no report would read (see indexes_pushes).
+
+    Args:
+        repo_type: 'github' or 'bitbucket'
+        repository: Full name, e.g. 'owner/repo'
+        clone_url: Clone URL named by the payload
+        updates: PushUpdate objects
+
+    Returns:
+        One dict per update with branch, before, after and action: 'ingested'
+        (with the number of commits), 'up-to-date', 'deleted', 'fetched',
+        'fetch-queued', 'failed' (with the error) or 'skipped'
+    """
+    clone_url = strip_credentials(clone_url)
+    applied = indexes_pushes(repo_type)
+    if applied:
+        _record_delivery(repo_type, repository, clone_url, updates)
+
+    index = CommitIndex()
+    results = []
+    for update in updates:
+        result = {"branch": update.branch, "before": update.before, "after": update.after}
+        if not applied:
+            result["action"] = 'skipped'
+            results.append(result)
+            continue
+        if update.deleted:
+            index.delete_branch(clone_url, update.branch)
+            result["action"] = 'deleted'
+            results.append(result)
+            continue
+
+        stored = index.push(clone_url, update.branch, update.before, update.after, update.commits)
+        if stored:
+            result.update(action='ingested', commits=stored)
+        elif stored == 0:
+            result["action"] = 'up-to-date'
+        elif settings.WEBHOOK_FETCH_IN_BACKGROUND:
+            get_fetch_executor().submit(_fetch_in_background, clone_url, update.branch)
+            result["action"] = 'fetch-queued'
+        else:
+            error = fetch_branch(clone_url, update.branch)
+            if error is None:
+                result["action"] = 'fetched'
+            else:
+                result.update(action='failed', error=error)
+        results.append(result)
+    return results
+
+
+def _record_delivery(repo_type, repository, clone_url, updates):
+    """
+    Mark the repository as kept current by pushes, and keep its list of pushed branches
+    """
+    now = django_timezone.now()
+    tracked, _ = TrackedRepository.objects.get_or_create(
+        repo_type=repo_type,
+        key=normalize_repository(repo_type, repository),
+        defaults={
+            'repo_path': repository,
+            # Pushes keep it current; the scheduler only catches up on missed ones
+            'refresh_interval': settings.WEBHOOK_RECONCILE_INTERVAL,
+            'next_run_at': now + timedelta(seconds=settings.WEBHOOK_RECONCILE_INTERVAL),
+        }
+    )
+    deleted = {update.branch for update in updates if update.deleted}
+    branches = [branch for branch in tracked.branches if branch not in deleted]
+    for update in updates:
+        if not update.deleted and update.branch not in branches:
+            branches.append(update.branch)
+    tracked.branches = branches
+    tracked.webhook_url = clone_url
+    tracked.webhook_at = now
+    tracked.save(update_fields=['branches', 'webhook_url', 'webhook_at'])
+
+
+def fetch_branch(clone_url, branch):
+    """
+    Fetch one pushed branch into the repository's mirror and ingest it into the commit index
+
+    Returns:
+        Error message, or None if the branch was ingested
+    """
+    try:
+        CommitIndex().ingest(clone_url, branch, targeted=True)
+    except ValueError as e:
+        logger.warning("Webhook fetch of %s from %s failed: %s", branch, clone_url, e)
+        return str(e)
+    return None
+
+
+def _fetch_in_background(clone_url, branch):
+    try:
+        fetch_branch(clone_url, branch)
+    except Exception:
+        logger.exception("Webhook fetch of %s from %s failed", branch, clone_url)
+    finally:
+        connections.close_all()
+
+
+_fetch_executor = None
+_fetch_executor_lock = threading.Lock()
+
+
+def get_fetch_executor():
+    """
+    Get the process-wide pool (settings.WEBHOOK_FETCH_WORKERS threads) running webhook-triggered fetches
+    """
+    global _fetch_executor
+    with _fetch_executor_lock:
+        if _fetch_executor is None:
+            _fetch_executor = ThreadPoolExecutor(
+                max_workers=settings.WEBHOOK_FETCH_WORKERS,
+                thread_name_prefix='webhook-fetch'
+            )
+    return _fetch_executor
@@ -14,3 +14,8 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'gitreportgenerator2.settings')
 
 application = get_asgi_application()
+
+# Apps are loaded now; keep tracked repositories warm here if PREFETCH_IN_PROCESS is set
+from commitreport.prefetch import start_in_process_scheduler  # noqa: E402
+
+start_in_process_scheduler()
@@ -49,6 +49,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'commitreport.middleware.ServerTimingMiddleware',
 ]
 
 ROOT_URLCONF = 'gitreportgenerator2.urls'
@@ -134,8 +135,175 @@ STATIC_URL = 'static/'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Logging
+# https://docs.djangoproject.com/en/5.1/topics/logging/
+# commitreport logs fallbacks and failures (clone retries, failed jobs, prefetches
+# and webhook fetches) to the console; raise the level to WARNING to quieten it
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'commitreport': {
+            'handlers': ['console'],
+            'level': os.environ.get('COMMITREPORT_LOG_LEVEL', 'INFO'),
+        },
+    },
+}
+
 # Git API Configuration
-GIT_TEMP_CLONE_DIR = os.path.join(BASE_DIR, 'temp_repos')
+# Remote repositories are kept as bare mirrors and only fetched on later requests
+GIT_MIRROR_CACHE_DIR = os.path.join(BASE_DIR, 'repo_cache')
+
+# How remote repositories are cloned into the mirror cache:
+# 'bare'     - full bare clone
+# 'blobless' - bare clone without file contents (--filter=blob:none)
+# 'shallow'  - bare clone of history since the request's start_date (--shallow-since)
+# Partial and shallow clones fall back to 'bare' when the server does not support them
+GIT_CLONE_STRATEGY = 'blobless'
+
+# Keep a commit-graph in every mirror, updated after each clone and fetch, so
+# walks of long histories read commits without parsing them. The write runs in
+# the fetch slot of the request that fetched, delaying it. Changed-path Bloom
+# filters, which let walks limited to paths skip most tree diffs, are only added
+# once a report limited to paths has read the mirror
+GIT_COMMIT_GRAPH_ENABLED = False
+
+# Clones and fetches running at once across all worker processes sharing
+# GIT_MIRROR_CACHE_DIR; more wait up to GIT_FETCH_QUEUE_TIMEOUT seconds for a slot
+GIT_MAX_CONCURRENT_FETCHES = 4
+GIT_FETCH_QUEUE_TIMEOUT = 300
+
+# A mirror fetched at most this many seconds before a request arrived is read
+# without fetching again. Requests queued behind a fetch share it. Either way only
+# a fetch made with the request's own credentials counts, so a mirror fetched with
+# a token is never served to requests without it
+GIT_MIRROR_FETCH_INTERVAL = 10
+
+# Least recently used mirrors are evicted once either limit is exceeded
+GIT_MIRROR_CACHE_MAX_BYTES = 20 * 1024 ** 3
+GIT_MIRROR_CACHE_MAX_COUNT = 100
+
+# Serve 'local' repository reports from the indexed commit store in the database,
+# ingesting only commits that are new since the last request. Off by default: the
+# first report on a branch ingests its whole history whatever its date range, which
+# takes far longer than walking it once. Use a database server (not SQLite) with
+# several worker processes, as SQLite allows one writer at a time
+COMMIT_INDEX_ENABLED = False
+
+# Provider API roots; the benchmark suite points them at local stand-in servers
+GITHUB_API_URL = 'https://api.github.com'
+BITBUCKET_API_URL = 'https://api.bitbucket.org'
+
+# Read Bitbucket repositories through a git mirror first and use the API only if
+# that fails. Turn off to always use the API
+BITBUCKET_GIT_FIRST = True
+
+# Maximum number of concurrent per-commit requests (file lists, diffstats) made to
+# the GitHub and Bitbucket APIs, and connections kept alive per host
+PROVIDER_FETCH_CONCURRENCY = 8
+
+# On-disk cache of GitHub and Bitbucket API responses. Pages are revalidated with
+# ETag / Last-Modified; per-commit resources are immutable and never refetched
+HTTP_CACHE_ENABLED = True
+HTTP_CACHE_DIR = os.path.join(BASE_DIR, 'http_cache')
+HTTP_CACHE_MAX_BYTES = 1024 ** 3
+
+# Threads running blocking git and provider work for the async commits endpoint
+# (served through gitreportgenerator2/asgi.py); requests beyond this wait without a thread
+ASYNC_REPORT_WORKERS = 32
+
+# Repositories of each type processed at once by the batch commits endpoint
+BATCH_PROVIDER_CONCURRENCY = {
+    'local': 4,
+    'github': 8,
+    'bitbucket': 4,
+}
 
-# Create temp directory if it doesn't exist
-os.makedirs(GIT_TEMP_CLONE_DIR, exist_ok=True)
+# Threads running background report jobs (/api/jobs/), and the longest a client
+# may long-poll a job with ?wait=<seconds>
+REPORT_JOB_WORKERS = 4
+REPORT_JOB_MAX_WAIT = 30
+
+# Seconds between heartbeats of the jobs a process has queued or is running, and
+# how long a job may go without one before it is failed as abandoned (its process
+# exited or restarted) and identical requests start a new job instead of joining it
+REPORT_JOB_HEARTBEAT = 15
+REPORT_JOB_LEASE = 120
+
+# Finished reports are cached under their request parameters and branch tip, so
+# they are only recomputed once the branch moves. Swap in
+# django.core.cache.backends.filebased.FileBasedCache with a LOCATION directory to
+# share the cache between worker processes.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'reports': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'reports',
+        'TIMEOUT': 24 * 60 * 60,
+        'OPTIONS': {'MAX_ENTRIES': 500},
+    },
+}
+REPORT_CACHE_ENABLED = True
+# Reports with more commits than this are not cached. A cached report is held in
+# memory while it is read, and with MAX_ENTRIES above the cache can hold this
+# many commits 500 times over. NDJSON streams and /api/commits/stats/ read from
+# the cache but never fill it.
+REPORT_CACHE_MAX_COMMITS = 5000
+
+# Add a Server-Timing header with per-phase durations (clone, fetch, walk, API
+# pagination, diffs, serialize) and counters to report responses. Aggregates are
+# served for Prometheus at /api/metrics/ either way
+SERVER_TIMING_HEADER = True
+
+# Background prefetch of tracked repositories (/api/tracked/): mirrors are fetched,
+# the commit index is ingested and provider API pages are revalidated every
+# refresh interval (seconds), so reports find them warm. Failed refreshes back off
+# exponentially up to PREFETCH_MAX_BACKOFF, and every delay is spread by
+# +/- PREFETCH_JITTER to keep repositories from refreshing in lockstep
+PREFETCH_DEFAULT_INTERVAL = 15 * 60
+PREFETCH_MIN_INTERVAL = 60
+PREFETCH_MAX_BACKOFF = 6 * 60 * 60
+PREFETCH_JITTER = 0.1
+# Repositories refreshed at once, and how often the scheduler looks for due ones
+PREFETCH_CONCURRENCY = 2
+PREFETCH_POLL_INTERVAL = 30
+# A claimed repository is handed to another scheduler if not refreshed within this
+PREFETCH_LEASE = 30 * 60
+# Days of commits whose listing pages warm the HTTP cache for Bitbucket without
+# git; only the listing is read, never each commit's files. GitHub listings carry
+# each report's own dates, so GitHub repositories are not prefetched through the API
+PREFETCH_API_WINDOW_DAYS = 30
+# Run the scheduler in each web server process; otherwise run `manage.py prefetch_worker`
+PREFETCH_IN_PROCESS = False
+
+# Push webhooks (/api/webhooks/github/, /api/webhooks/bitbucket/) must be signed
+# with these shared secrets (HMAC-SHA256 of the body); without a secret, every
+# delivery of that provider is rejected
+GITHUB_WEBHOOK_SECRET = os.environ.get('GITHUB_WEBHOOK_SECRET', '')
+BITBUCKET_WEBHOOK_SECRET = os.environ.get('BITBUCKET_WEBHOOK_SECRET', '')
+# Pushes whose payload doesn't list every new commit with its files (new and
+# force-pushed branches, very large pushes, all Bitbucket pushes) fetch just the
+# pushed branch. This runs after answering, on WEBHOOK_FETCH_WORKERS threads, as
+# GitHub gives up on a delivery after 10 seconds; turn off to fetch before answering
+WEBHOOK_FETCH_IN_BACKGROUND = True
+WEBHOOK_FETCH_WORKERS = 2
+# Answer Bitbucket reports on pushed branches from the commit index instead of a
+# mirror fetch (with BITBUCKET_GIT_FIRST, which reports the same fields). One
+# branch API request with the caller's credentials still checks their access and
+# that the index holds the current tip; otherwise the report goes to the provider
+WEBHOOK_REPORTS_FROM_INDEX = False
+# Repositories that push webhooks registered are ingested again this often by the
+# prefetch scheduler, catching up on deliveries that were missed or failed
+WEBHOOK_RECONCILE_INTERVAL = 60 * 60
+
+# Create cache directories if they don't exist
+os.makedirs(GIT_MIRROR_CACHE_DIR, exist_ok=True)
+os.makedirs(HTTP_CACHE_DIR, exist_ok=True)